@@ -7,19 +7,26 @@
 # (at your option) any later version.
 """Api module for database administration via website"""
 
+import io
 import os
+import re
+import csv
+import json
+import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 from sqlite3 import IntegrityError
+from concurrent.futures import ThreadPoolExecutor
 import uvicorn
 
 import aiosqlite
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Body, Depends
+from fastapi import FastAPI, HTTPException, Body, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
@@ -66,18 +73,25 @@ async def lifespan(app: FastAPI):
     providing the essential database schema for the application to function properly
     from the start.
     """
-    await init_db()
+    global schema_version  # pylint: disable=global-statement
+    schema_version = await init_db()
     await init_admin_db()
+    checkpoint_task = asyncio.create_task(checkpoint_wal())
     yield
+    checkpoint_task.cancel()
+    await truncate_wal()
+    password_hasher.shutdown()
 
 app = FastAPI(lifespan=lifespan)
+# Schema version of users.db after the startup migrations
+schema_version = None
 
 # Setting up CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all sources
     allow_credentials=True,
-    allow_methods=["POST", "GET", "PUT", "DELETE"],  # Allows method
+    allow_methods=["POST", "GET", "PUT", "PATCH", "DELETE"],  # Allows method
     allow_headers=["Content-Type", "Authorization"],  # Allows headers
 )
 
@@ -121,6 +135,66 @@ RESET_PASSWORD = os.getenv("RESET_PASSWORD", "false").lower() == "true"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt threads; each hash or verification occupies one for ~250 ms
+PASSWORD_HASH_WORKERS = int(os.getenv("ADMIN_PASSWORD_HASH_WORKERS", "2"))
+# Hash operations allowed to wait for a thread before new ones get 503
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("ADMIN_PASSWORD_HASH_QUEUE_LIMIT", "16"))
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool so logins never block the event loop.
+
+    At most `workers` operations run at once and at most `queue_limit` wait
+    for a thread; beyond that the request is refused with 503, so a login
+    storm cannot build an unbounded backlog.
+    """
+
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.running = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="bcrypt")
+
+    async def run(self, func, *args):
+        """Run a bcrypt function in the pool and return its result."""
+        if self.queued >= self.queue_limit:
+            logger.warning("Password hashing queue is full (%d waiting)", self.queued)
+            raise HTTPException(status_code=503, detail="Server busy, try again later",
+                                headers={"Retry-After": "1"})
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        # The slot is held until the thread is done, even if the caller goes away
+        future.add_done_callback(self._release)
+        return await asyncio.shield(future)
+
+    def _release(self, _):
+        self.running -= 1
+        self._slots.release()
+
+    def stats(self):
+        """Current load of the pool, reported by /health."""
+        return {"workers": self.workers, "running": self.running,
+                "queued": self.queued, "queue_limit": self.queue_limit}
+
+    def shutdown(self):
+        """Stop the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+# Bot language of a user: a two-letter code such as "en" or "ru"
+LANGUAGE_PATTERN = "^[a-z]{2}$"
+
 # Model for user data
 
 
@@ -133,13 +207,77 @@ class UserUpdate(BaseModel):
         telegram_id (int): The user's Telegram identifier.
         is_bypass (bool): Flag indicating whether there are special rules to let in without request.
         The default value is False.
+        language (str, optional): Language of the bot messages for this user;
+        None uses the FREE2FA_TELEGRAM_BOT_LANGUAGE of the API. Left out, the
+        stored language is kept.
     """
     domain_and_username: str
     telegram_id: int
     is_bypass: bool
+    language: Optional[str] = Field(None, pattern=LANGUAGE_PATTERN)
 
 
 DATABASE_PATH = '/opt/db/users.db'
+# How long a write waits for a lock held by the other container
+DB_BUSY_TIMEOUT_MS = int(os.getenv("ADMIN_DB_BUSY_TIMEOUT_MS", "5000"))
+# Seconds between WAL checkpoints
+DB_CHECKPOINT_INTERVAL = int(os.getenv("ADMIN_DB_CHECKPOINT_INTERVAL", "300"))
+# Approvals remembered by the RADIUS API (created by free2fa4rdg_api when its cache is on)
+APPROVAL_CACHE_PATH = os.getenv("FREE2FA_APPROVAL_CACHE_PATH", "/opt/db/approvals.db")
+
+# Schema changes of users.db as (version, description, statements), applied in order
+SCHEMA_MIGRATIONS = [
+    (1, "users table", ['''
+        CREATE TABLE IF NOT EXISTS users (
+            domain_and_username TEXT PRIMARY KEY UNIQUE,
+            telegram_id INTEGER,
+            is_bypass BOOLEAN NOT NULL DEFAULT FALSE
+        )
+    ''']),
+    (2, "index on users.telegram_id", [
+        'CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users (telegram_id)',
+    ]),
+    (3, "users.language", [
+        'ALTER TABLE users ADD COLUMN language TEXT',
+    ]),
+]
+
+# Default and largest page of GET /users/
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 1000
+
+# Largest number of users changed by one batch request
+BATCH_MAX_ITEMS = 5000
+# Bulk import/export: rows per transaction and per streamed chunk
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+# Per-row errors returned in the import report (the rest are only counted)
+IMPORT_MAX_ERRORS = 100
+# Longest accepted import line, in bytes
+IMPORT_MAX_LINE = 64 * 1024
+USER_COLUMNS = ("domain_and_username", "telegram_id", "is_bypass", "language")
+IMPORT_STATEMENTS = {
+    # A NULL language (no such column or key) keeps the stored one, "" clears it
+    "upsert": ("INSERT INTO users (domain_and_username, telegram_id, is_bypass, language) "
+               "VALUES (?1, ?2, ?3, NULLIF(?4, '')) ON CONFLICT(domain_and_username) DO UPDATE "
+               "SET telegram_id = excluded.telegram_id, is_bypass = excluded.is_bypass, "
+               "language = CASE WHEN ?4 IS NULL THEN users.language ELSE excluded.language END"),
+    "skip": ("INSERT OR IGNORE INTO users (domain_and_username, telegram_id, is_bypass, language) "
+             "VALUES (?, ?, ?, NULLIF(?, ''))"),
+}
+# "fail" mode: the rows are checked in a temporary table, then copied in one transaction
+IMPORT_STAGING_TABLE = ("CREATE TEMP TABLE import_staging (line INTEGER PRIMARY KEY, "
+                        "domain_and_username TEXT NOT NULL UNIQUE, telegram_id INTEGER, "
+                        "is_bypass BOOLEAN, language TEXT)")
+IMPORT_STAGE = ("INSERT INTO import_staging "
+                "(line, domain_and_username, telegram_id, is_bypass, language) "
+                "VALUES (?, ?, ?, ?, NULLIF(?, ''))")
+IMPORT_CONFLICT = ("SELECT s.line, s.domain_and_username FROM import_staging s "
+                   "JOIN users u ON u.domain_and_username = s.domain_and_username "
+                   "WHERE s.line >= ? ORDER BY s.line LIMIT 1")
+IMPORT_APPLY = ("INSERT INTO users (domain_and_username, telegram_id, is_bypass, language) "
+                "SELECT domain_and_username, telegram_id, is_bypass, language "
+                "FROM import_staging ORDER BY line")
 
 
 class User(BaseModel):
@@ -152,10 +290,67 @@ class User(BaseModel):
         is_bypass (bool, optional):
         Flag indicating whether there are special rules to let in without request.
         The default value is False.
+        language (str, optional): Language of the bot messages for this user;
+        None uses the FREE2FA_TELEGRAM_BOT_LANGUAGE of the API.
     """
     domain_and_username: str
     telegram_id: int
     is_bypass: bool = False
+    language: Optional[str] = Field(None, pattern=LANGUAGE_PATTERN)
+
+
+class UserPatch(BaseModel):
+    """
+    Change of one user in a batch update; fields left out keep their value.
+
+    Attributes:
+        domain_and_username (str): The user to change.
+        telegram_id (int, optional): New Telegram identifier.
+        is_bypass (bool, optional): New bypass flag.
+        language (str, optional): New bot language; "" goes back to the API default.
+    """
+    domain_and_username: str
+    telegram_id: Optional[int] = None
+    is_bypass: Optional[bool] = None
+    language: Optional[str] = Field(None, pattern=LANGUAGE_PATTERN + "|^$")
+
+
+class BatchUpdate(BaseModel):
+    """
+    Body of PATCH /users/batch.
+
+    Attributes:
+        items (List[UserPatch]): Changes to apply.
+        atomic (bool): Apply nothing if any item fails.
+    """
+    items: List[UserPatch] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    atomic: bool = False
+
+
+class ApprovalInvalidation(BaseModel):
+    """
+    Body of DELETE /approvals.
+
+    Attributes:
+        usernames (List[str]): Users whose remembered approvals are dropped.
+        machine_name (str, optional): Only drop approvals for this computer.
+        all (bool): Drop the approvals of every user.
+    """
+    usernames: List[str] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    machine_name: Optional[str] = None
+    all: bool = False
+
+
+class BatchDelete(BaseModel):
+    """
+    Body of DELETE /users/batch.
+
+    Attributes:
+        usernames (List[str]): Users to delete.
+        atomic (bool): Delete nothing if any user does not exist.
+    """
+    usernames: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    atomic: bool = False
 
 
 async def generate_password_hash(password):
@@ -168,7 +363,7 @@ async def generate_password_hash(password):
     Returns:
         str: A hashed version of the password.
     """
-    return pwd_context.hash(password)
+    return await password_hasher.run(pwd_context.hash, password)
 
 
 def create_access_token(data: dict, scopes: List[str]):
@@ -200,7 +395,7 @@ async def authenticate_user(username: str, password: str):
     Returns:
         dict or None: User object if authentication is successful; None otherwise.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+    async with connect_db() as db_connection:
         query = ('SELECT username, hashed_password FROM admins WHERE username = ?')
         async with db_connection.execute(query, (username,)) as cursor:
             admin = await cursor.fetchone()
@@ -220,7 +415,23 @@ async def verify_password(plain_password, hashed_password):
     Returns:
         bool: True if the password is correct, False otherwise.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_hasher.run(pwd_context.verify, plain_password, hashed_password)
+
+
+@asynccontextmanager
+async def connect_db():
+    """
+    Opens a connection to the shared users.db with the settings every
+    connection of the admin API uses.
+
+    The busy timeout makes a writer wait for the RADIUS API instead of failing
+    with "database is locked"; synchronous=NORMAL is safe in WAL mode and
+    saves an fsync per commit.
+    """
+    async with aiosqlite.connect(DATABASE_PATH,
+                                 timeout=DB_BUSY_TIMEOUT_MS / 1000) as db_connection:
+        await db_connection.execute("PRAGMA synchronous=NORMAL")
+        yield db_connection
 
 
 async def get_db():
@@ -245,7 +456,7 @@ async def get_db():
     This ensures efficient and safe management of database connections, especially
     in asynchronous applications.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+    async with connect_db() as db_connection:
         yield db_connection
 
 
@@ -253,30 +464,82 @@ async def init_db():
     """
     Asynchronously initializes the database.
 
-    This function establishes a connection to the SQLite database using aiosqlite. It
-    creates the 'users' table if it doesn't already exist. The 'users' table includes
-    columns for 'domain_and_username', 'telegram_id', and 'is_bypass'. The
-    'domain_and_username' column is set as the primary key and is unique for each
-    record. The 'is_bypass' column is a boolean value, defaulting to FALSE if not
-    specified.
-
-    The database schema is essential for storing and managing user data effectively,
-    especially in applications integrating with Telegram bots or requiring user
-    authentication and management.
+    Switches users.db to write-ahead logging, so that the RADIUS API keeps
+    reading while the admin API writes, and brings the schema up to date by
+    applying the pending SCHEMA_MIGRATIONS. Each migration runs in its own
+    transaction together with its row in the 'schema_version' table, so an
+    interrupted upgrade resumes where it stopped.
 
     This function should be called when the application starts, ensuring that the
     necessary database structure is in place for the application to function correctly.
+
+    Returns:
+        int: The schema version after the upgrade.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+    async with connect_db() as db_connection:
+        # Persistent: recorded in the database file for every connection
+        async with db_connection.execute("PRAGMA journal_mode=WAL") as cursor:
+            journal_mode = (await cursor.fetchone())[0]
+        if journal_mode.lower() != "wal":
+            logger.warning("users.db journal mode is %s, WAL is not available", journal_mode)
         await db_connection.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                domain_and_username TEXT PRIMARY KEY UNIQUE,
-                telegram_id INTEGER,
-                is_bypass BOOLEAN NOT NULL DEFAULT FALSE
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         await db_connection.commit()
 
+        async with db_connection.execute(
+                'SELECT COALESCE(MAX(version), 0) FROM schema_version') as cursor:
+            current_version = (await cursor.fetchone())[0]
+        for version, description, statements in SCHEMA_MIGRATIONS:
+            if version <= current_version:
+                continue
+            logger.info("Applying schema migration %d: %s", version, description)
+            # sqlite3 does not open a transaction for DDL by itself
+            await db_connection.execute("BEGIN IMMEDIATE")
+            for statement in statements:
+                await db_connection.execute(statement)
+            await db_connection.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description))
+            await db_connection.commit()
+            current_version = version
+    return current_version
+
+
+async def checkpoint_wal():
+    """
+    Periodically folds the write-ahead log back into users.db.
+
+    SQLite checkpoints on commit once the log reaches 1000 pages, but only if
+    no reader holds an older snapshot at that moment. This task retries on a
+    timer with a PASSIVE checkpoint, which never blocks readers or writers.
+    """
+    while True:
+        await asyncio.sleep(DB_CHECKPOINT_INTERVAL)
+        try:
+            async with connect_db() as db_connection:
+                async with db_connection.execute(
+                        "PRAGMA wal_checkpoint(PASSIVE)") as cursor:
+                    busy, log_pages, checkpointed = await cursor.fetchone()
+            if busy or checkpointed < log_pages:
+                logger.info("WAL checkpoint incomplete: %d of %d pages",
+                            checkpointed, log_pages)
+        except aiosqlite.Error as error:
+            logger.warning("WAL checkpoint failed: %s", error)
+
+
+async def truncate_wal():
+    """Checkpoints and empties the write-ahead log on shutdown."""
+    try:
+        async with connect_db() as db_connection:
+            await db_connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except aiosqlite.Error as error:
+        logger.warning("Final WAL checkpoint failed: %s", error)
+
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
@@ -339,13 +602,14 @@ async def add_user(user: User, _: User = Depends(get_current_user)):
     """
     user.domain_and_username = user.domain_and_username.lower()
     sql_query = (
-        'INSERT INTO users (domain_and_username, telegram_id, is_bypass) '
-        'VALUES (?, ?, ?)'
+        'INSERT INTO users (domain_and_username, telegram_id, is_bypass, language) '
+        'VALUES (?, ?, ?, ?)'
     )
-    async with aiosqlite.connect(DATABASE_PATH) as db_conn:
+    async with connect_db() as db_conn:
         try:
             await db_conn.execute(sql_query,
-                                  (user.domain_and_username, user.telegram_id, user.is_bypass))
+                                  (user.domain_and_username, user.telegram_id, user.is_bypass,
+                                   user.language))
             await db_conn.commit()
             return {"message": "User added successfully"}
         except aiosqlite.IntegrityError as integrity_error:
@@ -356,24 +620,466 @@ async def add_user(user: User, _: User = Depends(get_current_user)):
 
 
 @app.get("/users/")
-async def get_all_users(_: User = Depends(get_current_user)):
+async def get_all_users(after: Optional[str] = None,
+                        limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE),
+                        search: Optional[str] = None,
+                        match: str = Query("contains", pattern="^(contains|prefix)$"),
+                        is_bypass: Optional[bool] = None,
+                        no_telegram: Optional[bool] = None,
+                        order: str = Query("asc", pattern="^(asc|desc)$"),
+                        _: User = Depends(get_current_user)):
     """
-    Fetches and returns a list of all users from the database.
+    Returns one page of users ordered by domain_and_username.
 
-    This function connects to the database asynchronously and retrieves all user records.
-    Access is restricted to authenticated users only.
+    Pagination is keyset based: pass the `next_after` value of a page as `after`
+    to get the next one, so every page costs the same however deep it is.
 
     Args:
+        after (str, optional): Last domain_and_username of the previous page.
+        limit (int): Page size.
+        search (str, optional): Text to look for in domain_and_username.
+        match (str): "contains" (substring) or "prefix" search.
+        is_bypass (bool, optional): Only bypass (true) or non-bypass (false) users.
+        no_telegram (bool, optional): Only users with (false) or without (true) a Telegram ID.
+        order (str): "asc" or "desc".
         current_user (User): The authenticated user, obtained via dependency injection.
 
     Returns:
-        List[dict]: A list of dictionaries, each representing a user record.
+        dict: `items` (list of users), `total` (users matching the filters)
+        and `next_after` (cursor of the next page, None on the last page).
+    """
+    conditions = []
+    params = []
+    if search:
+        search = search.lower()
+        if match == "prefix":
+            # A range on the primary key instead of LIKE, so the index is used
+            conditions.append("domain_and_username >= ? AND domain_and_username < ?")
+            params += [search, search + "\U0010ffff"]
+        else:
+            conditions.append("instr(domain_and_username, ?) > 0")
+            params.append(search)
+    if is_bypass is not None:
+        conditions.append("is_bypass = ?")
+        params.append(is_bypass)
+    if no_telegram is not None:
+        conditions.append("telegram_id = 0" if no_telegram else "telegram_id != 0")
+    where = " AND ".join(conditions) or "1"
+
+    page_conditions = where
+    page_params = list(params)
+    if after is not None:
+        page_conditions += " AND domain_and_username " + (">" if order == "asc" else "<") + " ?"
+        page_params.append(after.lower())
+
+    async with connect_db() as db_connection:
+        async with db_connection.execute(
+                f"SELECT COUNT(*) FROM users WHERE {where}", params) as cursor:
+            total = (await cursor.fetchone())[0]
+        async with db_connection.execute(
+                "SELECT domain_and_username, telegram_id, is_bypass, language FROM users "
+                f"WHERE {page_conditions} ORDER BY domain_and_username {order.upper()} "
+                "LIMIT ?", page_params + [limit + 1]) as cursor:
+            rows = await cursor.fetchall()
+
+    next_after = rows[limit - 1][0] if len(rows) > limit else None
+    items = [{"domain_and_username": row[0], "telegram_id": row[1], "is_bypass": bool(row[2]),
+              "language": row[3]} for row in rows[:limit]]
+    return {"items": items, "total": total, "next_after": next_after}
+
+
+class ImportAborted(Exception):
+    """Raised to roll back an import in "fail" mode."""
+
+
+class ImportReport:
+    """Counters and per-row errors of a bulk import."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.rows = 0
+        self.written = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        """Record a rejected row; only the first IMPORT_MAX_ERRORS are kept."""
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
+
+    def as_dict(self):
+        """Report returned to the client."""
+        return {"mode": self.mode, "rows": self.rows, "written": self.written,
+                "skipped": self.skipped, "invalid": self.invalid, "errors": self.errors,
+                "errors_truncated": self.invalid > len(self.errors)}
+
+
+def parse_bool(value):
+    """Reads a boolean written as true/false, yes/no or 1/0."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "y"):
+        return True
+    if text in ("", "0", "false", "no", "n"):
+        return False
+    raise ValueError(f"invalid is_bypass value: {value}")
+
+
+def normalize_import_row(record):
     """
-    logger.info("get_all_users")
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
-        async with db_connection.execute('SELECT * FROM users') as cursor:
-            users = await cursor.fetchall()
-            return users
+    Validates an imported record and converts it to a users row.
+
+    Args:
+        record (dict): Values by column name; telegram_id, is_bypass and language
+            may be missing.
+
+    Raises:
+        ValueError: If a value cannot be converted.
+
+    Returns:
+        tuple: (domain_and_username, telegram_id, is_bypass, language), where
+        language is None when the record has none and "" when it is empty.
+    """
+    username = str(record.get("domain_and_username") or "").strip().lower()
+    if not username:
+        raise ValueError("domain_and_username is empty")
+    telegram_id = record.get("telegram_id")
+    if telegram_id is None or str(telegram_id).strip() == "":
+        telegram_id = 0
+    try:
+        telegram_id = int(str(telegram_id).strip())
+    except ValueError as error:
+        raise ValueError(f"invalid telegram_id: {telegram_id}") from error
+    language = None
+    if "language" in record:
+        language = str(record["language"] or "").strip().lower()
+    if language and not re.fullmatch(LANGUAGE_PATTERN, language):
+        raise ValueError(f"invalid language: {language}")
+    return username, telegram_id, parse_bool(record.get("is_bypass", False)), language
+
+
+async def read_lines(request: Request):
+    """Yields the lines of the request body as they arrive, without buffering the body."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > IMPORT_MAX_LINE:
+            raise HTTPException(status_code=413, detail="Import line is too long")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def read_import_rows(request: Request, file_format):
+    """
+    Parses a CSV or NDJSON import body row by row.
+
+    CSV files may start with a header naming the columns; without one the
+    columns are domain_and_username, telegram_id, is_bypass, language.
+
+    Yields:
+        tuple: (line number, users row or None, error message or None)
+    """
+    columns = None
+    line_number = 0
+    async for raw_line in read_lines(request):
+        line_number += 1
+        try:
+            line = raw_line.decode("utf-8").lstrip("\ufeff").rstrip("\r")
+        except UnicodeDecodeError:
+            yield line_number, None, "line is not valid UTF-8"
+            continue
+        if not line.strip():
+            continue
+        try:
+            if file_format == "ndjson":
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("line is not a JSON object")
+            else:
+                values = next(csv.reader([line]))
+                if columns is None:
+                    columns = USER_COLUMNS
+                    if values and values[0].strip().lower() == "domain_and_username":
+                        columns = tuple(value.strip().lower() for value in values)
+                        continue
+                record = dict(zip(columns, values))
+            yield line_number, normalize_import_row(record), None
+        except ValueError as error:
+            yield line_number, None, str(error)
+
+
+async def write_import_batch(db_connection, mode, batch, report):
+    """
+    Writes a batch of rows with one executemany call.
+
+    In "fail" mode the batch only goes to the staging table.
+    """
+    if mode == "fail":
+        await stage_import_batch(db_connection, batch, report)
+        return
+    before = db_connection.total_changes
+    await db_connection.executemany(IMPORT_STATEMENTS[mode], [row for _, row in batch])
+    await db_connection.commit()
+    written = db_connection.total_changes - before
+    report.written += written
+    report.skipped += len(batch) - written
+
+
+async def stage_import_batch(db_connection, batch, report):
+    """
+    Copies a batch of a "fail" mode import to the temporary staging table.
+
+    Only the connection's temporary database is written, so users stays free
+    for other writers while the body is received. A batch repeating a
+    username is replayed row by row to find the offending line; a user that
+    already exists aborts the import without waiting for the end of the file.
+    """
+    await db_connection.execute("SAVEPOINT import_batch")
+    try:
+        await db_connection.executemany(
+            IMPORT_STAGE, [(line_number, *row) for line_number, row in batch])
+    except aiosqlite.IntegrityError:
+        await db_connection.execute("ROLLBACK TO import_batch")
+        for line_number, row in batch:
+            try:
+                await db_connection.execute(IMPORT_STAGE, (line_number, *row))
+            except aiosqlite.IntegrityError:
+                report.invalid += 1
+                report.error(line_number, f"user {row[0]} appears more than once")
+                raise ImportAborted() from None
+    await db_connection.execute("RELEASE import_batch")
+    await check_import_conflict(db_connection, report, batch[0][0])
+
+
+async def check_import_conflict(db_connection, report, first_line=0):
+    """Aborts the import at the first staged user, from `first_line` on, that already exists."""
+    async with db_connection.execute(IMPORT_CONFLICT, (first_line,)) as cursor:
+        conflict = await cursor.fetchone()
+    if conflict is not None:
+        report.invalid += 1
+        report.error(conflict[0], f"user {conflict[1]} already exists")
+        raise ImportAborted()
+
+
+async def apply_staged_import(db_connection, report):
+    """Copies the staged rows to users in one short write transaction."""
+    await db_connection.execute("BEGIN IMMEDIATE")
+    # Users may have been added while the file was being received
+    await check_import_conflict(db_connection, report)
+    before = db_connection.total_changes
+    await db_connection.execute(IMPORT_APPLY)
+    report.written += db_connection.total_changes - before
+    await db_connection.commit()
+
+
+@app.post("/users/import")
+async def import_users(request: Request,
+                       file_format: str = Query("csv", alias="format",
+                                                pattern="^(csv|ndjson)$"),
+                       mode: str = Query("upsert", pattern="^(upsert|skip|fail)$"),
+                       _: User = Depends(get_current_user)):
+    """
+    Imports users from a CSV or NDJSON request body.
+
+    The body is parsed while it is received and written in transactions of
+    IMPORT_BATCH_SIZE rows, so memory use does not grow with the file. In
+    "fail" mode the rows are collected in a temporary table and users is only
+    written, in one short transaction, once the whole file has been checked.
+
+    Args:
+        request (Request): Body with one user per line.
+        file_format (str): "csv" or "ndjson" (query parameter `format`).
+        mode (str): What to do with existing users: "upsert" updates them,
+            "skip" keeps them, "fail" rejects the whole import (nothing is written).
+        _ (User): The authenticated user, verified by the JWT token.
+
+    Raises:
+        HTTPException: 409 with the report if the import was aborted in "fail" mode.
+
+    Returns:
+        dict: Row counts and the first IMPORT_MAX_ERRORS per-row errors.
+    """
+    report = ImportReport(mode)
+    batch = []
+    async with connect_db() as db_connection:
+        if mode == "fail":
+            await db_connection.execute(IMPORT_STAGING_TABLE)
+        try:
+            async for line_number, row, error in read_import_rows(request, file_format):
+                report.rows += 1
+                if error is not None:
+                    report.invalid += 1
+                    report.error(line_number, error)
+                    if mode == "fail":
+                        raise ImportAborted()
+                    continue
+                batch.append((line_number, row))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await write_import_batch(db_connection, mode, batch, report)
+                    batch = []
+            if batch:
+                await write_import_batch(db_connection, mode, batch, report)
+            if mode == "fail":
+                await apply_staged_import(db_connection, report)
+        except ImportAborted:
+            await db_connection.rollback()
+            report.written = report.skipped = 0
+            logger.warning("User import aborted at line %s", report.errors[-1]["line"])
+            raise HTTPException(status_code=409, detail=report.as_dict()) from None
+    logger.info("Imported users: %s", {key: value for key, value in report.as_dict().items()
+                                       if key != "errors"})
+    return report.as_dict()
+
+
+def format_export_rows(rows, file_format):
+    """Renders a chunk of users rows as CSV or NDJSON text."""
+    if file_format == "ndjson":
+        return "".join(
+            json.dumps({"domain_and_username": row[0], "telegram_id": row[1],
+                        "is_bypass": bool(row[2]), "language": row[3]}) + "\n"
+            for row in rows)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerows((row[0], row[1], "true" if row[2] else "false", row[3] or "")
+                     for row in rows)
+    return output.getvalue()
+
+
+async def stream_users(file_format):
+    """Yields the users table chunk by chunk straight from a cursor."""
+    if file_format == "csv":
+        yield ",".join(USER_COLUMNS) + "\r\n"
+    async with connect_db() as db_connection:
+        async with db_connection.execute(
+                "SELECT domain_and_username, telegram_id, is_bypass, language FROM users "
+                "ORDER BY domain_and_username") as cursor:
+            while rows := await cursor.fetchmany(EXPORT_CHUNK_SIZE):
+                yield format_export_rows(rows, file_format)
+
+
+@app.get("/users/export")
+async def export_users(file_format: str = Query("csv", alias="format",
+                                                pattern="^(csv|ndjson)$"),
+                       _: User = Depends(get_current_user)):
+    """
+    Exports all users as a CSV or NDJSON download.
+
+    Rows are streamed from the database cursor in chunks of EXPORT_CHUNK_SIZE,
+    so the table is never held in memory. The output can be imported back.
+
+    Args:
+        file_format (str): "csv" or "ndjson" (query parameter `format`).
+        _ (User): The authenticated user, verified by the JWT token.
+
+    Returns:
+        StreamingResponse: The users, one per line.
+    """
+    media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_users(file_format), media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{file_format}"'})
+
+
+def batch_report(results, atomic):
+    """
+    Summarizes per-item results of a batch request.
+
+    Raises:
+        HTTPException: 409 with the results if the batch was atomic and an item failed.
+    """
+    failed = sum(1 for result in results if result["status"] not in ("updated", "deleted"))
+    report = {"results": results, "succeeded": len(results) - failed, "failed": failed}
+    if atomic and failed:
+        for result in results:
+            if result["status"] in ("updated", "deleted"):
+                result["status"] = "rolled_back"
+        report["succeeded"] = 0
+        raise HTTPException(status_code=409, detail=report)
+    return report
+
+
+@app.patch("/users/batch")
+async def update_users_batch(batch: BatchUpdate, _: User = Depends(get_current_user)):
+    """
+    Updates the Telegram ID, bypass flag and/or bot language of many users in one transaction.
+
+    Args:
+        batch (BatchUpdate): Changes to apply and whether the batch is atomic.
+        _ (User): The authenticated user, verified by the JWT token.
+
+    Raises:
+        HTTPException: 409 with the per-item results if the batch is atomic and
+                       an item failed; nothing is written in that case.
+
+    Returns:
+        dict: Per-item status ("updated", "not_found" or "invalid") and totals.
+    """
+    results = []
+    async with connect_db() as db_connection:
+        for item in batch.items:
+            username = item.domain_and_username.lower()
+            if item.telegram_id is None and item.is_bypass is None and item.language is None:
+                results.append({"domain_and_username": username, "status": "invalid",
+                                "detail": "nothing to update"})
+                continue
+            cursor = await db_connection.execute(
+                'UPDATE users SET telegram_id = COALESCE(?, telegram_id), '
+                'is_bypass = COALESCE(?, is_bypass), '
+                "language = CASE WHEN ? IS NULL THEN language ELSE NULLIF(?, '') END "
+                'WHERE domain_and_username = ?',
+                (item.telegram_id, item.is_bypass, item.language, item.language, username))
+            results.append({"domain_and_username": username,
+                            "status": "updated" if cursor.rowcount else "not_found"})
+        try:
+            report = batch_report(results, batch.atomic)
+        except HTTPException:
+            await db_connection.rollback()
+            raise
+        await db_connection.commit()
+    logger.info("Batch update: %d updated, %d failed", report["succeeded"], report["failed"])
+    return report
+
+
+@app.delete("/users/batch")
+async def delete_users_batch(batch: BatchDelete, _: User = Depends(get_current_user)):
+    """
+    Deletes many users in one transaction.
+
+    Declared before DELETE /users/{domain_and_username} so that "batch" is not
+    taken for a username.
+
+    Args:
+        batch (BatchDelete): Users to delete and whether the batch is atomic.
+        _ (User): The authenticated user, verified by the JWT token.
+
+    Raises:
+        HTTPException: 409 with the per-item results if the batch is atomic and
+                       a user was not found; nothing is deleted in that case.
+
+    Returns:
+        dict: Per-item status ("deleted" or "not_found") and totals.
+    """
+    results = []
+    async with connect_db() as db_connection:
+        for username in batch.usernames:
+            username = username.lower()
+            cursor = await db_connection.execute(
+                'DELETE FROM users WHERE domain_and_username = ?', (username,))
+            results.append({"domain_and_username": username,
+                            "status": "deleted" if cursor.rowcount else "not_found"})
+        try:
+            report = batch_report(results, batch.atomic)
+        except HTTPException:
+            await db_connection.rollback()
+            raise
+        await db_connection.commit()
+    logger.info("Batch delete: %d deleted, %d failed", report["succeeded"], report["failed"])
+    return report
 
 
 @app.delete("/users/{domain_and_username}")
@@ -393,13 +1099,60 @@ async def delete_user(domain_and_username: str, _: User = Depends(get_current_us
     Note:
     Intended for administrative use. Access should be restricted to authorized users.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+    async with connect_db() as db_connection:
         await db_connection.execute(
             'DELETE FROM users WHERE domain_and_username = ?', (domain_and_username,))
         await db_connection.commit()
         return {"message": "User deleted successfully"}
 
 
+@app.delete("/approvals")
+async def invalidate_approvals(request: ApprovalInvalidation,
+                               _: User = Depends(get_current_user)):
+    """
+    Forgets logons approved earlier, so the next logon of these users sends a push again.
+
+    The RADIUS API notices the deletion within a second and drops the entries
+    from its memory too.
+
+    Args:
+        request (ApprovalInvalidation): Users (or all users) and optionally a computer.
+        _ (User): The authenticated user, verified by the JWT token.
+
+    Raises:
+        HTTPException: 400 error if neither users nor `all` are given.
+
+    Returns:
+        dict: Number of approvals removed.
+    """
+    if not request.usernames and not request.all:
+        raise HTTPException(status_code=400, detail="No users given")
+    machine_filter = ""
+    machine_params = ()
+    if request.machine_name:
+        machine_filter = " AND machine_name = ?"
+        machine_params = (request.machine_name.lower(),)
+    try:
+        # mode=rw: do not create the file when the RADIUS API never enabled the cache
+        async with aiosqlite.connect(f"file:{APPROVAL_CACHE_PATH}?mode=rw", uri=True,
+                                     timeout=DB_BUSY_TIMEOUT_MS / 1000) as db_connection:
+            before = db_connection.total_changes
+            if request.all:
+                await db_connection.execute(
+                    "DELETE FROM approvals WHERE 1" + machine_filter, machine_params)
+            else:
+                await db_connection.executemany(
+                    "DELETE FROM approvals WHERE username = ?" + machine_filter,
+                    [(username.lower(), *machine_params) for username in request.usernames])
+            await db_connection.commit()
+            deleted = db_connection.total_changes - before
+    except aiosqlite.OperationalError as error:
+        logger.info("No approvals to invalidate: %s", error)
+        deleted = 0
+    logger.info("Invalidated %d remembered approvals", deleted)
+    return {"message": "Approvals invalidated", "deleted": deleted}
+
+
 @app.get("/verify-token")
 async def verify_token(_: User = Depends(get_current_user)):
     """
@@ -428,8 +1181,9 @@ async def update_user(username: str, user_update: UserUpdate = Body(...),
     """
     Updates the specified user's information in the database.
 
-    This endpoint allows updating user data such as domain_and_username, telegram_id, and
-    is_bypass flag for a given username. It is accessible only to authenticated users.
+    This endpoint allows updating user data such as domain_and_username, telegram_id,
+    is_bypass flag and bot language for a given username. It is accessible only to
+    authenticated users.
 
     Args:
         username (str): The username of the user to be updated.
@@ -447,7 +1201,7 @@ async def update_user(username: str, user_update: UserUpdate = Body(...),
     user_update.domain_and_username = user_update.domain_and_username.lower()
     logger.info("Updating user")
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+        async with connect_db() as db_connection:
             # Checking user existence
             cursor = await db_connection.execute(
                 'SELECT * FROM users WHERE domain_and_username = ?', (username,))
@@ -455,12 +1209,15 @@ async def update_user(username: str, user_update: UserUpdate = Body(...),
             if not existing_user:
                 raise HTTPException(status_code=404, detail=ERROR404)
 
-            # Updating user data
+            # Updating user data; clients unaware of language leave it as it is
             await db_connection.execute('''
-                UPDATE users SET domain_and_username = ?, telegram_id = ?, is_bypass = ? 
+                UPDATE users SET domain_and_username = ?, telegram_id = ?, is_bypass = ?,
+                language = CASE WHEN ? THEN ? ELSE language END
                 WHERE domain_and_username = ?''',
                                         (user_update.domain_and_username,
-                                         user_update.telegram_id, user_update.is_bypass, username))
+                                         user_update.telegram_id, user_update.is_bypass,
+                                         "language" in user_update.model_fields_set,
+                                         user_update.language, username))
             await db_connection.commit()
             return {"message": "User updated successfully"}
 
@@ -498,10 +1255,12 @@ async def get_user(username: str, db_connection=Depends(get_db),
         HTTPException: 404 error if the user is not found.
     """
     async with db_connection.execute(
-            'SELECT * FROM users WHERE domain_and_username = ?', (username,)) as cursor:
+            'SELECT domain_and_username, telegram_id, is_bypass, language '
+            'FROM users WHERE domain_and_username = ?', (username,)) as cursor:
         user = await cursor.fetchone()
         if user:
-            return {"domain_and_username": user[0], "telegram_id": user[1], "is_bypass": user[2]}
+            return {"domain_and_username": user[0], "telegram_id": user[1], "is_bypass": user[2],
+                    "language": user[3]}
         raise HTTPException(status_code=404, detail=ERROR404)
 
 
@@ -515,9 +1274,11 @@ async def health_check():
     and readiness probes.
 
     Returns:
-        dict: A dictionary with the status of the service.
+        dict: A dictionary with the status of the service and the load of the
+        password hashing pool.
     """
-    return {"status": "ok"}
+    return {"status": "ok", "schema_version": schema_version,
+            "password_hashing": password_hasher.stats()}
 
 
 async def init_admin_db():
@@ -527,7 +1288,7 @@ async def init_admin_db():
     Creates the 'admins' table if it does not exist and adds a default admin user
     if not already present. The default admin is useful for initial setup and testing.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+    async with connect_db() as db_connection:
         await db_connection.execute('''
             CREATE TABLE IF NOT EXISTS admins (
                 username TEXT PRIMARY KEY,
@@ -598,7 +1359,7 @@ async def change_password(password_change: PasswordChange,
         dict: A message indicating successful password change.
     """
 
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+    async with connect_db() as db_connection:
         # Getting hashed current password from the database
         async with db_connection.execute(
             'SELECT hashed_password FROM admins WHERE username = ?',
@@ -609,7 +1370,8 @@ async def change_password(password_change: PasswordChange,
                 raise HTTPException(status_code=404, detail=ERROR404)
 
             # Checking old password
-            if not pwd_context.verify(password_change.old_password, current_hashed_password[0]):
+            if not await verify_password(password_change.old_password,
+                                         current_hashed_password[0]):
                 raise HTTPException(
                     status_code=403, detail="Old password is incorrect")
 
@@ -651,7 +1413,7 @@ async def reset_password(request: ResetPasswordRequest):
 
     # Reset admin password to 'admin'
     new_hashed_password = await generate_password_hash("admin")
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
+    async with connect_db() as db_connection:
         await db_connection.execute(
             'UPDATE admins SET hashed_password = ? WHERE username = ?',
             (new_hashed_password, "admin"))
@@ -125,11 +125,13 @@ document
     }
     const telegramId = document.getElementById("telegramId").value;
     const isBypass = document.getElementById("isBypass").checked;
+    const language = document.getElementById("language").value || null;
 
     const user = {
       domain_and_username: username,
       telegram_id: telegramId,
       is_bypass: isBypass,
+      language: language,
     };
 
     try {
@@ -157,14 +159,32 @@ document
     }
   });
 
-document.getElementById("loadUsers").addEventListener("click", loadUsers);
+document
+  .getElementById("userFilterForm")
+  .addEventListener("submit", function (e) {
+    e.preventDefault();
+    loadUsers();
+  });
+
+// Next page is requested when the table is scrolled close to its end
+document
+  .getElementById("usersTableContainer")
+  .addEventListener("scroll", function () {
+    const container = this;
+    if (
+      container.scrollTop + container.clientHeight >=
+      container.scrollHeight - 50
+    ) {
+      loadNextUsersPage();
+    }
+  });
 
 // Function for creating an edit button
 function createEditButton(user) {
   const button = document.createElement('button');
   button.textContent = 'Edit';
   button.addEventListener('click', function() {
-    showEditForm([user[0], user[1], user[2]]);
+    showEditForm([user.domain_and_username, user.telegram_id, user.is_bypass, user.language]);
   });
   return button;
 }
@@ -179,11 +199,236 @@ function createDeleteButton(username) {
   return button;
 }
 
+const USERS_PAGE_SIZE = 100;
+
+// Keyset pagination state of the users table
+const usersPaging = {
+  nextAfter: null,
+  loaded: 0,
+  total: 0,
+  loading: false,
+  finished: false,
+  generation: 0,
+};
+
+function buildUsersQuery() {
+  const params = new URLSearchParams({ limit: USERS_PAGE_SIZE });
+  const search = document.getElementById("filterSearch").value.trim();
+  if (search) {
+    params.set("search", search);
+    params.set("match", document.getElementById("filterMatch").value);
+  }
+  const bypass = document.getElementById("filterBypass").value;
+  if (bypass) {
+    params.set("is_bypass", bypass);
+  }
+  if (document.getElementById("filterNoTelegram").checked) {
+    params.set("no_telegram", "true");
+  }
+  if (usersPaging.nextAfter !== null) {
+    params.set("after", usersPaging.nextAfter);
+  }
+  return params.toString();
+}
+
+function appendUserRow(usersTableBody, user) {
+  const tr = document.createElement('tr');
+
+  // Creating and adding table cells
+  const td1 = document.createElement('td');
+  td1.textContent = user.domain_and_username;
+  tr.appendChild(td1);
+
+  const td2 = document.createElement('td');
+  td2.textContent = user.telegram_id;
+  tr.appendChild(td2);
+
+  const td3 = document.createElement('td');
+  td3.textContent = user.is_bypass ? "Yes" : "No";
+  tr.appendChild(td3);
+
+  const td4 = document.createElement('td');
+  td4.textContent = user.language || "Default";
+  tr.appendChild(td4);
+
+  // Create and add edit and delete buttons
+  const tdButtons = document.createElement('td');
+  const editButton = createEditButton(user);
+  const deleteButton = createDeleteButton(user.domain_and_username);
+  tdButtons.appendChild(editButton);
+  tdButtons.appendChild(deleteButton);
+  tr.appendChild(tdButtons);
+
+  // Multi-select for the batch actions
+  const tdSelect = document.createElement('td');
+  const checkbox = document.createElement('input');
+  checkbox.type = 'checkbox';
+  checkbox.className = 'userSelect';
+  checkbox.value = user.domain_and_username;
+  checkbox.checked = selectedUsers.has(user.domain_and_username);
+  checkbox.addEventListener('change', function() {
+    if (checkbox.checked) {
+      selectedUsers.add(checkbox.value);
+    } else {
+      selectedUsers.delete(checkbox.value);
+    }
+    updateSelectedCount();
+  });
+  tdSelect.appendChild(checkbox);
+  tr.appendChild(tdSelect);
+
+  usersTableBody.appendChild(tr);
+}
+
+// Users ticked in the table, kept across lazily loaded pages
+const selectedUsers = new Set();
+
+function updateSelectedCount() {
+  document.getElementById("selectedCount").textContent =
+    `${selectedUsers.size} selected`;
+}
+
+document
+  .getElementById("selectAllUsers")
+  .addEventListener("change", function () {
+    const checked = this.checked;
+    document.querySelectorAll("#usersTable .userSelect").forEach((checkbox) => {
+      checkbox.checked = checked;
+      if (checked) {
+        selectedUsers.add(checkbox.value);
+      } else {
+        selectedUsers.delete(checkbox.value);
+      }
+    });
+    updateSelectedCount();
+  });
+
+// Sends one batch request for all selected users and reports the per-user result
+async function runBatchAction(method, body, verb) {
+  if (selectedUsers.size === 0) {
+    showNotification("No users selected", "error");
+    return;
+  }
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/users/batch`, {
+      method: method,
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${sessionStorage.getItem("token")}`,
+      },
+      body: JSON.stringify(body),
+    });
+    if (!response.ok) {
+      throw new Error(`Error in batch request: ${response.statusText}`);
+    }
+    const report = await response.json();
+    report.results
+      .filter((result) => result.status !== "updated" && result.status !== "deleted")
+      .forEach((result) => console.error("Batch item failed:", result));
+    showNotification(
+      `${verb}: ${report.succeeded}, failed: ${report.failed}`,
+      report.failed === 0 ? "success" : "error",
+    );
+    selectedUsers.clear();
+    document.getElementById("selectAllUsers").checked = false;
+    updateSelectedCount();
+  } catch (error) {
+    console.error("Error in batch action:", error);
+    showNotification(error.message, "error");
+  } finally {
+    loadUsers();
+  }
+}
+
+function batchUpdate(changes) {
+  const items = Array.from(selectedUsers, (username) => ({
+    domain_and_username: username,
+    ...changes,
+  }));
+  return runBatchAction("PATCH", { items: items }, "Updated");
+}
 
+document
+  .getElementById("batchBypassOn")
+  .addEventListener("click", () => batchUpdate({ is_bypass: true }));
+document
+  .getElementById("batchBypassOff")
+  .addEventListener("click", () => batchUpdate({ is_bypass: false }));
+document
+  .getElementById("batchSetTelegramId")
+  .addEventListener("click", function () {
+    const telegramId = document.getElementById("batchTelegramId").value;
+    if (telegramId === "") {
+      showNotification("Enter a Telegram ID", "error");
+      return;
+    }
+    batchUpdate({ telegram_id: Number(telegramId) });
+  });
+document
+  .getElementById("batchForgetApprovals")
+  .addEventListener("click", async function () {
+    if (selectedUsers.size === 0) {
+      showNotification("No users selected", "error");
+      return;
+    }
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/approvals`, {
+        method: "DELETE",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${sessionStorage.getItem("token")}`,
+        },
+        body: JSON.stringify({ usernames: Array.from(selectedUsers) }),
+      });
+      if (!response.ok) {
+        throw new Error(`Error forgetting approvals: ${response.statusText}`);
+      }
+      const data = await response.json();
+      showNotification(`Forgotten approvals: ${data.deleted}`, "success");
+    } catch (error) {
+      console.error("Error forgetting approvals:", error);
+      showNotification(error.message, "error");
+    }
+  });
+document
+  .getElementById("batchDelete")
+  .addEventListener("click", function () {
+    if (selectedUsers.size === 0) {
+      showNotification("No users selected", "error");
+      return;
+    }
+    if (!confirm(`Delete ${selectedUsers.size} users?`)) {
+      return;
+    }
+    runBatchAction("DELETE", { usernames: Array.from(selectedUsers) }, "Deleted");
+  });
+
+// Clears the table and loads the first page with the current filters
 async function loadUsers() {
+  const usersTableBody = document.querySelector("#usersTable tbody");
+  while (usersTableBody.firstChild) {
+    usersTableBody.removeChild(usersTableBody.firstChild);
+  }
+  usersPaging.nextAfter = null;
+  usersPaging.loaded = 0;
+  usersPaging.total = 0;
+  usersPaging.loading = false;
+  usersPaging.finished = false;
+  // Pages still in flight for the previous filters are dropped
+  usersPaging.generation += 1;
+  document.getElementById("usersTableContainer").scrollTop = 0;
+  await loadNextUsersPage();
+}
+
+async function loadNextUsersPage() {
+  if (usersPaging.loading || usersPaging.finished) {
+    return;
+  }
+  usersPaging.loading = true;
+  const generation = usersPaging.generation;
   const token = sessionStorage.getItem("token");
   try {
-    const response = await fetch(`${API_BASE_URL}/api/users/`, {
+    const response = await fetch(`${API_BASE_URL}/api/users/?${buildUsersQuery()}`, {
       method: "GET",
       headers: {
         Authorization: `Bearer ${token}`,
@@ -195,45 +440,114 @@ async function loadUsers() {
       throw new Error(`Error fetching users: ${response.statusText}`);
     }
 
-    const users = await response.json();
+    const page = await response.json();
+    if (generation !== usersPaging.generation) {
+      return;
+    }
     const usersTableBody = document.querySelector("#usersTable tbody");
-
-    while (usersTableBody.firstChild) {
-      usersTableBody.removeChild(usersTableBody.firstChild);
+    page.items.forEach((user) => appendUserRow(usersTableBody, user));
+
+    usersPaging.loaded += page.items.length;
+    usersPaging.total = page.total;
+    usersPaging.nextAfter = page.next_after;
+    usersPaging.finished = page.next_after === null;
+    document.getElementById("usersCount").textContent =
+      `Shown ${usersPaging.loaded} of ${usersPaging.total}`;
+  } catch (error) {
+    console.error("Error loading users:", error);
+    showNotification(error.message, "error");
+    // Stop scrolling retries; "Load Users" starts over
+    usersPaging.finished = true;
+  } finally {
+    if (generation === usersPaging.generation) {
+      usersPaging.loading = false;
     }
+  }
 
-    users.forEach((user) => {
-      const tr = document.createElement('tr');
-
-      // Creating and adding table cells
-      const td1 = document.createElement('td');
-      td1.textContent = user[0];
-      tr.appendChild(td1);
-
-      const td2 = document.createElement('td');
-      td2.textContent = user[1];
-      tr.appendChild(td2);
+  // Keep loading while the page does not fill the table yet
+  const container = document.getElementById("usersTableContainer");
+  if (
+    !usersPaging.finished &&
+    generation === usersPaging.generation &&
+    container.scrollHeight <= container.clientHeight
+  ) {
+    loadNextUsersPage();
+  }
+}
 
-      const td3 = document.createElement('td');
-      td3.textContent = user[2] ? "Yes" : "No";
-      tr.appendChild(td3);
 
-      // Create and add edit and delete buttons
-      const tdButtons = document.createElement('td');
-      const editButton = createEditButton(user);
-      const deleteButton = createDeleteButton(user[0]);
-      tdButtons.appendChild(editButton);
-      tdButtons.appendChild(deleteButton);
-      tr.appendChild(tdButtons);
+document
+  .getElementById("importUsersForm")
+  .addEventListener("submit", async function (e) {
+    e.preventDefault();
+    const file = document.getElementById("importFile").files[0];
+    const mode = document.getElementById("importMode").value;
+    const format = /\.(ndjson|jsonl)$/i.test(file.name) ? "ndjson" : "csv";
+    try {
+      const response = await fetch(
+        `${API_BASE_URL}/api/users/import?format=${format}&mode=${mode}`,
+        {
+          method: "POST",
+          headers: {
+            "Content-Type": format === "csv" ? "text/csv" : "application/x-ndjson",
+            Authorization: `Bearer ${sessionStorage.getItem("token")}`,
+          },
+          body: file,
+        },
+      );
+      const data = await response.json();
+      const report = response.ok ? data : data.detail;
+      if (!response.ok && typeof report !== "object") {
+        throw new Error(`Import failed: ${response.statusText}`);
+      }
+      let message =
+        `Rows: ${report.rows}, written: ${report.written}, ` +
+        `skipped: ${report.skipped}, invalid: ${report.invalid}`;
+      if (report.errors.length > 0) {
+        const first = report.errors[0];
+        message += ` (line ${first.line}: ${first.error})`;
+        console.error("Import errors:", report.errors);
+      }
+      showNotification(message, response.ok && report.invalid === 0 ? "success" : "error");
+    } catch (error) {
+      console.error("Error importing users:", error);
+      showNotification("Failed to import users", "error");
+    } finally {
+      document.getElementById("importUsersForm").reset();
+      loadUsers();
+    }
+  });
 
-      usersTableBody.appendChild(tr);
+async function exportUsers(format) {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/users/export?format=${format}`, {
+      headers: {
+        Authorization: `Bearer ${sessionStorage.getItem("token")}`,
+      },
     });
+    if (!response.ok) {
+      throw new Error(`Error exporting users: ${response.statusText}`);
+    }
+    const url = URL.createObjectURL(await response.blob());
+    const link = document.createElement("a");
+    link.href = url;
+    link.download = `users.${format}`;
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    URL.revokeObjectURL(url);
   } catch (error) {
-    console.error("Error loading users:", error);
+    console.error("Error exporting users:", error);
     showNotification(error.message, "error");
   }
 }
 
+document
+  .getElementById("exportCsvButton")
+  .addEventListener("click", () => exportUsers("csv"));
+document
+  .getElementById("exportNdjsonButton")
+  .addEventListener("click", () => exportUsers("ndjson"));
 
 async function deleteUser(username) {
   const token = sessionStorage.getItem("token");
@@ -268,6 +582,7 @@ function showEditForm(user) {
   document.getElementById("editUsername").value = user[0];
   document.getElementById("editTelegramId").value = user[1];
   document.getElementById("editisBypass").checked = user[2];
+  document.getElementById("editLanguage").value = user[3] || "";
 }
 
 document
@@ -282,11 +597,13 @@ document
     }
     const newTelegramId = document.getElementById("editTelegramId").value;
     const newIsBypass = document.getElementById("editisBypass").checked;
+    const newLanguage = document.getElementById("editLanguage").value || null;
 
     const requestBody = {
       domain_and_username: newUsername,
       telegram_id: newTelegramId,
       is_bypass: newIsBypass,
+      language: newLanguage,
     };
 
     console.log("Sending PUT request with data:", JSON.stringify(requestBody));
@@ -369,6 +686,7 @@ document
             user.domain_and_username,
             user.telegram_id,
             user.is_bypass,
+            user.language,
           ]);
         };
 
@@ -0,0 +1,160 @@
+# fake_telegram.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""
+Local stand-in for the Telegram Bot API used by the benchmarks.
+
+Every message sent with an inline keyboard is answered by a simulated user:
+after `tap_delay` seconds a callback_query pressing the first (permit) or
+the second (reject) button is queued for getUpdates, or posted to the
+webhook if one was registered. A message with a row per account gets one
+tap per row. Run it on its own with:
+
+    python fake_telegram.py --port 8081 --tap-delay 0.5
+
+and start free2fa4rdg_api with FREE2FA_TELEGRAM_API_SERVER=http://127.0.0.1:8081.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from aiohttp import web, ClientSession
+
+
+class FakeTelegram:
+    """In-memory Bot API implementing the methods free2fa4rdg_api calls."""
+
+    def __init__(self, tap_delay=0.5, reject_ratio=0.0, method_latency=0.0):
+        self.tap_delay = tap_delay
+        self.reject_ratio = reject_ratio
+        self.method_latency = method_latency
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updates = []
+        self._new_update = asyncio.Condition()
+        self._webhook = None
+        self._tasks = set()
+
+    def app(self):
+        """aiohttp application serving /bot{token}/{method}."""
+        application = web.Application()
+        application.router.add_post("/bot{token}/{method}", self.handle)
+        return application
+
+    async def handle(self, request):
+        """Dispatch a Bot API call."""
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = dict(await request.post())
+        if self.method_latency:
+            await asyncio.sleep(self.method_latency)
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            return web.json_response({"ok": True, "result": True})
+        return web.json_response({"ok": True, "result": await handler(params)})
+
+    async def api_getMe(self, _):  # pylint: disable=invalid-name
+        """Bot identity."""
+        return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+
+    async def api_setWebhook(self, params):  # pylint: disable=invalid-name
+        """Deliver updates by POST from now on."""
+        self._webhook = (params["url"], params.get("secret_token", ""))
+        return True
+
+    async def api_deleteWebhook(self, _):  # pylint: disable=invalid-name
+        """Deliver updates through getUpdates from now on."""
+        self._webhook = None
+        return True
+
+    async def api_getUpdates(self, params):  # pylint: disable=invalid-name
+        """Long polling."""
+        offset = int(params.get("offset", 0))
+        timeout = float(params.get("timeout", 0))
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout:
+            async with self._new_update:
+                try:
+                    await asyncio.wait_for(self._new_update.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return self._updates[:100]
+
+    async def api_sendMessage(self, params):  # pylint: disable=invalid-name
+        """Record the message and let the simulated user tap a button."""
+        chat_id = int(params["chat_id"])
+        message = {"message_id": next(self._message_ids), "date": int(time.time()),
+                   "chat": {"id": chat_id, "type": "private", "first_name": "Bench"},
+                   "text": params.get("text", "")}
+        markup = json.loads(params.get("reply_markup") or "null")
+        for buttons in (markup or {}).get("inline_keyboard", []):
+            choice = buttons[1] if random.random() < self.reject_ratio else buttons[0]
+            task = asyncio.create_task(self._tap(chat_id, message, choice["callback_data"]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return message
+
+    async def api_editMessageReplyMarkup(self, params):  # pylint: disable=invalid-name
+        """Keyboard removal."""
+        return {"message_id": int(params["message_id"]), "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"}}
+
+    async def _tap(self, chat_id, message, data):
+        await asyncio.sleep(self.tap_delay)
+        update = {"update_id": next(self._update_ids),
+                  "callback_query": {"id": str(random.getrandbits(48)), "chat_instance": "1",
+                                     "from": {"id": chat_id, "is_bot": False,
+                                              "first_name": "Bench"},
+                                     "message": message, "data": data}}
+        if self._webhook:
+            url, secret = self._webhook
+            async with ClientSession() as session:
+                await session.post(url, json=update, ssl=False,
+                                   headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+            return
+        self._updates.append(update)
+        async with self._new_update:
+            self._new_update.notify_all()
+
+
+async def serve(fake, host, port):
+    """Start the fake server and return its runner."""
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--tap-delay", type=float, default=0.5,
+                        help="seconds before the simulated user taps a button")
+    parser.add_argument("--reject-ratio", type=float, default=0.0,
+                        help="share of requests the simulated user rejects")
+    parser.add_argument("--method-latency", type=float, default=0.0,
+                        help="extra latency of every Bot API call, in seconds")
+    args = parser.parse_args()
+
+    async def run():
+        fake = FakeTelegram(args.tap_delay, args.reject_ratio, args.method_latency)
+        await serve(fake, args.host, args.port)
+        print(f"Fake Bot API on http://{args.host}:{args.port}")
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
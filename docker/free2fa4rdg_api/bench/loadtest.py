@@ -0,0 +1,298 @@
+# loadtest.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""
+Load test of the RADIUS REST API (free2fa4rdg_api) against a fake Bot API.
+
+For every combination of --users and --concurrency the script starts a
+fresh API process on a temporary database, then lets `concurrency`
+simulated FreeRADIUS threads log users on the way the rest module does:
+POST /authorize followed by POST /authenticate with the same JSON body.
+The fake Bot API taps "permit" after --tap-delay seconds.
+
+Reported per run: logon throughput, p50/p95/p99 latency of /authorize,
+/authenticate and the whole logon, event-loop lag (latency of /health
+probes sent every 100 ms), and the peak RSS of the API process.
+
+Example (from docker/free2fa4rdg_api/bench):
+    python loadtest.py --users 100,1000 --concurrency 10,50 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import aiohttp
+from fake_telegram import FakeTelegram, serve
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "files", "app")
+CLIENT_KEY = "bench-client-key"
+BENCH_TOKEN = "123456:BENCHMARK"
+# Seconds the API gets to shut down gracefully before it is killed
+STOP_TIMEOUT = 10
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def free_port():
+    """Ask the OS for an unused TCP port."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def create_database(path, users):
+    """Create the users table the admin API would create and fill it."""
+    connection = sqlite3.connect(path)
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            domain_and_username TEXT PRIMARY KEY UNIQUE,
+            telegram_id INTEGER,
+            is_bypass BOOLEAN NOT NULL DEFAULT FALSE,
+            language TEXT
+        )
+    ''')
+    connection.executemany(
+        "INSERT INTO users (domain_and_username, telegram_id, is_bypass) VALUES (?, ?, 0)",
+        ((f"bench\\user{number}", 100000 + number) for number in range(users)))
+    connection.commit()
+    connection.close()
+
+
+def create_certificate(directory):
+    """Self-signed certificate so the run pays the same TLS cost as production."""
+    keyfile = os.path.join(directory, "api.key")
+    certfile = os.path.join(directory, "api.crt")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                    "-keyout", keyfile, "-out", certfile, "-days", "1",
+                    "-subj", "/CN=127.0.0.1"],
+                   check=True, capture_output=True)
+    return keyfile, certfile
+
+
+def rss_kib(pid):
+    """Resident set size of a process in KiB (Linux)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class Run:
+    """One API process under one load level."""
+
+    def __init__(self, args, users, concurrency, workdir, telegram_url):
+        self.args = args
+        self.users = users
+        self.concurrency = concurrency
+        self.workdir = workdir
+        self.telegram_url = telegram_url
+        self.port = free_port()
+        self.process = None
+        self.base_url = None
+        self.latencies = {"authorize": [], "authenticate": [], "logon": [], "lag": []}
+        self.statuses = {}
+        self.peak_rss = 0
+        self.elapsed = 0.0
+
+    def start_api(self, tls_files):
+        """Start main.py with the benchmark environment."""
+        database = os.path.join(self.workdir, f"users_{self.users}_{self.concurrency}.db")
+        create_database(database, self.users)
+        env = dict(os.environ,
+                   FREE2FA_TELEGRAM_BOT_TOKEN=BENCH_TOKEN,
+                   FREE2FA_TELEGRAM_API_SERVER=self.telegram_url,
+                   FREE2FA_TELEGRAM_CHAT_RATE_LIMIT="100",
+                   FREE2FA_TIMEOUT=str(self.args.timeout),
+                   FREE2FA_DATABASE_PATH=database,
+                   FREE2FA_API_PORT=str(self.port),
+                   FREE2FA_API_WORKERS=str(self.args.workers),
+                   FREE2FA_IPC_SOCKET=os.path.join(self.workdir, f"ipc_{self.port}.sock"))
+        scheme = "http"
+        if tls_files:
+            env["FREE2FA_API_SSL_KEYFILE"], env["FREE2FA_API_SSL_CERTFILE"] = tls_files
+            scheme = "https"
+        else:
+            env["FREE2FA_API_SSL_KEYFILE"] = env["FREE2FA_API_SSL_CERTFILE"] = ""
+        self.base_url = f"{scheme}://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "main.py"], cwd=APP_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    async def wait_ready(self, session):
+        """Wait until /health answers."""
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{self.base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError("API did not start")
+
+    async def post(self, session, path, user_name):
+        """One REST call as rlm_rest sends it."""
+        started = time.perf_counter()
+        async with session.post(f"{self.base_url}/{path}",
+                                json={"user_name": user_name, "client_key": CLIENT_KEY}) as resp:
+            await resp.read()
+            self.statuses[(path, resp.status)] = self.statuses.get((path, resp.status), 0) + 1
+        self.latencies[path].append(time.perf_counter() - started)
+
+    async def radius_thread(self, session, number, stop_at):
+        """Log users on in a loop; thread i uses users i, i + concurrency, ..."""
+        user = number
+        while time.monotonic() < stop_at:
+            user_name = f"BENCH\\user{user % self.users}"
+            started = time.perf_counter()
+            await self.post(session, "authorize", user_name)
+            await self.post(session, "authenticate", user_name)
+            self.latencies["logon"].append(time.perf_counter() - started)
+            user += self.concurrency
+
+    async def probe(self, session, stop_at):
+        """Measure event-loop lag as /health latency and sample memory."""
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            async with session.get(f"{self.base_url}/health") as response:
+                await response.read()
+            self.latencies["lag"].append(time.perf_counter() - started)
+            self.peak_rss = max(self.peak_rss, rss_kib(self.process.pid))
+            await asyncio.sleep(0.1)
+
+    async def execute(self, tls_files):
+        """Start the API, apply the load and stop the API."""
+        self.start_api(tls_files)
+        ssl_context = False
+        if tls_files:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        # Like the rest module's libcurl pool: one kept-alive connection per RADIUS thread
+        connector = aiohttp.TCPConnector(ssl=ssl_context, limit=self.concurrency + 1)
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout + 5)
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                await self.wait_ready(session)
+                await self.post(session, "authorize", "key")
+                for key in self.latencies:
+                    self.latencies[key].clear()
+                self.statuses.clear()
+                started = time.monotonic()
+                stop_at = started + self.args.duration
+                await asyncio.gather(self.probe(session, stop_at),
+                                     *(self.radius_thread(session, number, stop_at)
+                                       for number in range(self.concurrency)))
+                self.elapsed = time.monotonic() - started
+        finally:
+            await self.stop_api()
+
+    async def stop_api(self):
+        """Stop the API without blocking the loop the fake Bot API runs on."""
+        self.process.terminate()
+        try:
+            await asyncio.to_thread(self.process.wait, STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            await asyncio.to_thread(self.process.wait)
+
+    def summary(self):
+        """Results of the run as a dictionary."""
+        result = {"users": self.users, "concurrency": self.concurrency,
+                  "logons": len(self.latencies["logon"]),
+                  "logons_per_second": round(len(self.latencies["logon"]) / self.elapsed, 2),
+                  "peak_rss_mib": round(self.peak_rss / 1024, 1),
+                  "statuses": {f"{path} {status}": count
+                               for (path, status), count in sorted(self.statuses.items())}}
+        for name, values in self.latencies.items():
+            for label, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                result[f"{name}_{label}_ms"] = round(percentile(values, fraction) * 1000, 2)
+        return result
+
+
+def print_table(results):
+    """Human-readable results."""
+    header = ("users", "conc", "logons/s", "authz p50/p99 ms", "authn p50/p95/p99 ms",
+              "lag p99 ms", "rss MiB")
+    print(" | ".join(header))
+    for result in results:
+        print(" | ".join((
+            str(result["users"]), str(result["concurrency"]),
+            str(result["logons_per_second"]),
+            f'{result["authorize_p50_ms"]}/{result["authorize_p99_ms"]}',
+            f'{result["authenticate_p50_ms"]}/{result["authenticate_p95_ms"]}'
+            f'/{result["authenticate_p99_ms"]}',
+            str(result["lag_p99_ms"]), str(result["peak_rss_mib"]))))
+        print("    statuses:", result["statuses"])
+
+
+async def run_all(args):
+    """Run the whole matrix against one fake Bot API."""
+    fake = FakeTelegram(tap_delay=args.tap_delay, reject_ratio=args.reject_ratio)
+    telegram_port = free_port()
+    runner = await serve(fake, "127.0.0.1", telegram_port)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        tls_files = None if args.no_tls else create_certificate(workdir)
+        for users in args.users:
+            for concurrency in args.concurrency:
+                run = Run(args, users, concurrency, workdir,
+                          f"http://127.0.0.1:{telegram_port}")
+                await run.execute(tls_files)
+                results.append(run.summary())
+    await runner.cleanup()
+    print_table(results)
+    print("Bot API calls:", fake.calls)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+
+def int_list(value):
+    """Parse '10,50,100'."""
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int_list, default=[100, 1000])
+    parser.add_argument("--concurrency", type=int_list, default=[10, 50])
+    parser.add_argument("--duration", type=float, default=20,
+                        help="seconds of load per combination")
+    parser.add_argument("--tap-delay", type=float, default=0.5)
+    parser.add_argument("--reject-ratio", type=float, default=0.0)
+    parser.add_argument("--timeout", type=int, default=10, help="FREE2FA_TIMEOUT of the API")
+    parser.add_argument("--workers", type=int, default=1, help="FREE2FA_API_WORKERS of the API")
+    parser.add_argument("--no-tls", action="store_true", help="serve the API over plain HTTP")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(run_all(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
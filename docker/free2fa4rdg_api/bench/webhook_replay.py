@@ -0,0 +1,104 @@
+# webhook_replay.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""
+Replays recorded Telegram updates against the webhook endpoint of free2fa4rdg_api.
+
+Each line of the updates file is one Update object as Telegram sends it.
+update_id values are rewritten so every post looks new to the dispatcher.
+
+Example:
+    python webhook_replay.py --url https://127.0.0.1:5000/telegram/webhook \\
+        --secret "$FREE2FA_WEBHOOK_SECRET" --updates updates.ndjson \\
+        --repeat 200 --concurrency 20 --insecure
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import statistics
+import time
+import aiohttp
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def load_updates(path):
+    """Read the recorded updates, one JSON object per line."""
+    with open(path, encoding="utf-8") as updates_file:
+        return [json.loads(line) for line in updates_file if line.strip()]
+
+
+async def replay(args):
+    """Post the updates and collect the response latency of each call."""
+    updates = load_updates(args.updates)
+    ssl_context = None
+    if args.insecure:
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret}
+    queue = asyncio.Queue()
+    for round_number in range(args.repeat):
+        for position, update in enumerate(updates):
+            update = dict(update)
+            update["update_id"] = round_number * len(updates) + position + 1
+            queue.put_nowait(update)
+
+    latencies = []
+    statuses = {}
+
+    async def worker(session):
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.perf_counter()
+            async with session.post(args.url, json=update, headers=headers) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(ssl=ssl_context, limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"updates posted: {len(latencies)} in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:.1f} updates/s)")
+    print(f"status codes:   {statuses}")
+    print(f"latency ms:     p50 {percentile(latencies, 0.5) * 1000:.2f}  "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f}  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}  "
+          f"mean {statistics.fmean(latencies) * 1000:.2f}")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="https://127.0.0.1:5000/telegram/webhook")
+    parser.add_argument("--secret", required=True,
+                        help="value of FREE2FA_WEBHOOK_SECRET on the API side")
+    parser.add_argument("--updates", default="updates.ndjson")
+    parser.add_argument("--repeat", type=int, default=100,
+                        help="how many times the whole file is posted")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--insecure", action="store_true",
+                        help="do not verify the API certificate")
+    asyncio.run(replay(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,4 +5,5 @@ update-ca-certificates;
 
 
 # Starting the container's main command
-exec su -s /bin/sh apiuser -c "$*"
\ No newline at end of file
+# setpriv execs the command, so it gets SIGTERM directly and can shut down gracefully
+exec setpriv --reuid=apiuser --regid=apiuser --init-groups "$@"
\ No newline at end of file
@@ -0,0 +1,162 @@
+# approvals.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Recently approved user/computer pairs, kept in memory and persisted in SQLite."""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+import aiosqlite
+from metrics import Counter, Gauge
+
+logger = logging.getLogger("free2fa4rdg")
+
+LOOKUPS = Counter("free2fa_approval_cache_lookups_total",
+                  "Approval cache lookups by result", ["result"])
+STORED = Counter("free2fa_approval_cache_stored_total", "Approvals written to the cache")
+RELOADS = Counter("free2fa_approval_cache_reloads_total",
+                  "Approval cache reloads by reason", ["reason"])
+
+# Prune expired and surplus rows from the table every this many refreshes
+PRUNE_EVERY = 60
+
+
+class ApprovalCache:
+    """
+    Remembers that a user confirmed a logon from a computer (MS-Machine-Name)
+    so reconnects within `ttl` seconds do not send a new push, the same way
+    the cache_2fa module of FreeRADIUS does.
+
+    Entries live in an LRU dictionary of at most `maxsize` items and in the
+    approvals table of a separate SQLite file, so they survive restarts. A
+    dedicated connection writes the approvals and polls PRAGMA data_version,
+    which only changes on commits of other connections: the admin API
+    deleting entries or other API workers adding them. The cache is then
+    reloaded from the table.
+    """
+
+    def __init__(self, path, ttl, maxsize, refresh_interval=1.0):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.refresh_interval = refresh_interval
+        self._entries = OrderedDict()
+        self._connection = None
+        self._data_version = None
+        self._watch_task = None
+        Gauge("free2fa_approval_cache_entries", "Approvals held in memory",
+              callback=lambda: len(self._entries))
+
+    def get(self, username, machine_name):
+        """Whether the user approved a logon from this computer within the TTL."""
+        if not machine_name:
+            LOOKUPS.inc(result="no_machine")
+            return False
+        key = (username, machine_name.lower())
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            LOOKUPS.inc(result="miss")
+            return False
+        if expires_at <= time.time():
+            del self._entries[key]
+            LOOKUPS.inc(result="expired")
+            return False
+        self._entries.move_to_end(key)
+        LOOKUPS.inc(result="hit")
+        return True
+
+    async def add(self, username, machine_name):
+        """Remember an approval; a failed write only costs the persistence."""
+        if not machine_name:
+            return
+        key = (username, machine_name.lower())
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at)
+        STORED.inc()
+        try:
+            await self._connection.execute(
+                "INSERT OR REPLACE INTO approvals (username, machine_name, expires_at) "
+                "VALUES (?, ?, ?)", (*key, expires_at))
+            await self._connection.commit()
+        except aiosqlite.Error as db_err:
+            logger.warning("Approval for %s was not persisted: %s", username, db_err)
+
+    def _remember(self, key, expires_at):
+        self._entries[key] = expires_at
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def reload(self, reason="forced"):
+        """Replace the memory copy with the newest unexpired rows of the table."""
+        async with self._connection.execute(
+                "SELECT username, machine_name, expires_at FROM approvals "
+                "WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), self.maxsize)) as cursor:
+            rows = await cursor.fetchall()
+        # Oldest first, so the LRU order follows the approval time
+        self._entries = OrderedDict(((row[0], row[1]), row[2]) for row in reversed(rows))
+        RELOADS.inc(reason=reason)
+        logger.info("Approval cache loaded: %d entries (%s)", len(self._entries), reason)
+
+    async def prune(self):
+        """Delete expired rows and rows beyond maxsize from the table."""
+        await self._connection.execute(
+            "DELETE FROM approvals WHERE expires_at <= ?", (time.time(),))
+        await self._connection.execute(
+            "DELETE FROM approvals WHERE rowid IN (SELECT rowid FROM approvals "
+            "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)", (self.maxsize,))
+        await self._connection.commit()
+
+    async def _read_data_version(self):
+        async with self._connection.execute("PRAGMA data_version") as cursor:
+            row = await cursor.fetchone()
+            return row[0]
+
+    async def _watch(self):
+        """Reload on changes made by other connections and prune the table now and then."""
+        refreshes = 0
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                data_version = await self._read_data_version()
+                if data_version != self._data_version:
+                    await self.reload("changed")
+                    self._data_version = data_version
+                refreshes += 1
+                if refreshes % PRUNE_EVERY == 0:
+                    await self.prune()
+            except aiosqlite.Error as db_err:
+                logger.warning("Approval cache refresh failed: %s", db_err)
+
+    async def start(self, busy_timeout_ms=5000):
+        """Open the database, create the table if needed, load it and start watching."""
+        self._connection = await aiosqlite.connect(self.path, timeout=busy_timeout_ms / 1000)
+        await self._connection.execute("PRAGMA journal_mode=WAL")
+        await self._connection.execute("PRAGMA synchronous=NORMAL")
+        await self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS approvals (
+                username TEXT NOT NULL,
+                machine_name TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (username, machine_name)
+            )
+        ''')
+        await self._connection.commit()
+        self._data_version = await self._read_data_version()
+        await self.reload("startup")
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Stop watching and close the connection."""
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._connection:
+            await self._connection.close()
+            self._connection = None
@@ -0,0 +1,164 @@
+# breaker.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Circuit breaker around the Bot API client."""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from metrics import Counter, Gauge
+
+logger = logging.getLogger("free2fa4rdg")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE = Gauge("free2fa_telegram_breaker_state",
+              "1 for the current state of the Bot API circuit breaker", ["state"])
+TRANSITIONS = Counter("free2fa_telegram_breaker_transitions_total",
+                      "Bot API circuit breaker state changes", ["state"])
+REJECTED = Counter("free2fa_telegram_breaker_rejected_total",
+                   "Bot API calls refused without a network attempt", ["method"])
+
+# Long polling holds the connection open on purpose: neither latency nor a probe
+UNGUARDED_METHODS = frozenset({"getUpdates"})
+
+
+class CircuitOpenError(TelegramNetworkError):
+    """Raised instead of calling the Bot API while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of Bot API calls over the last `window` seconds.
+
+    A call fails when it raises a network or server error or takes longer
+    than `slow_call` seconds. Once at least `min_calls` calls were made and
+    the failed share reaches `failure_rate`, the breaker opens: calls are
+    refused at once for `open_seconds`. Then up to `probes` calls go through
+    (half-open); if they succeed the breaker closes, otherwise it opens again.
+    """
+
+    def __init__(self, window, min_calls, failure_rate, slow_call, open_seconds,
+                 probes=1, on_change=None):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.on_change = on_change
+        self.state = CLOSED
+        self._calls = deque()  # (finished_at, failed)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            STATE.set(1 if state == CLOSED else 0, state=state)
+
+    def _transition(self, state):
+        logger.warning("Telegram circuit breaker %s -> %s", self.state, state)
+        STATE.set(0, state=self.state)
+        STATE.set(1, state=state)
+        TRANSITIONS.inc(state=state)
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._probes_started = 0
+            self._probes_passed = 0
+        else:
+            self._calls.clear()
+            self._failures = 0
+        if self.on_change is not None:
+            self.on_change(self.status())
+
+    def _trim(self, now):
+        while self._calls and self._calls[0][0] <= now - self.window:
+            _, failed = self._calls.popleft()
+            self._failures -= failed
+
+    def allow(self):
+        """Whether a call may go to the network now; counts a probe when half-open."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes_started >= self.probes:
+                return False
+            self._probes_started += 1
+        return True
+
+    def abandon(self):
+        """Give back the probe slot of a call that was cancelled before finishing."""
+        if self.state == HALF_OPEN and self._probes_started > 0:
+            self._probes_started -= 1
+
+    def record(self, duration, error=None):
+        """Account for a finished call."""
+        failed = (duration > self.slow_call or
+                  isinstance(error, (TelegramNetworkError, TelegramServerError,
+                                     asyncio.TimeoutError)))
+        if self.state == HALF_OPEN:
+            if failed:
+                self._transition(OPEN)
+            else:
+                self._probes_passed += 1
+                if self._probes_passed >= self.probes:
+                    self._transition(CLOSED)
+            return
+        if self.state == OPEN:
+            # Started before the breaker opened
+            return
+        now = time.monotonic()
+        self._trim(now)
+        self._calls.append((now, failed))
+        self._failures += failed
+        if (len(self._calls) >= self.min_calls and
+                self._failures >= self.failure_rate * len(self._calls)):
+            self._transition(OPEN)
+
+    def status(self):
+        """State and rolling counts, as reported by /health."""
+        self._trim(time.monotonic())
+        status = {"state": self.state, "calls": len(self._calls), "failures": self._failures}
+        if self.state == OPEN:
+            status["retry_in"] = round(
+                max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+        return status
+
+
+class CircuitBreakerMiddleware(BaseRequestMiddleware):
+    """Session middleware refusing Bot API calls while the breaker is open."""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        if name in UNGUARDED_METHODS:
+            return await make_request(bot, method)
+        if not self.breaker.allow():
+            REJECTED.inc(method=name)
+            raise CircuitOpenError(method=method, message="Telegram circuit breaker is open")
+        started = time.perf_counter()
+        try:
+            result = await make_request(bot, method)
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception as error:
+            self.breaker.record(time.perf_counter() - started, error)
+            raise
+        self.breaker.record(time.perf_counter() - started)
+        return result
@@ -9,28 +9,222 @@
 """ A module containing configuration parameters for an application. """
 
 import os
+import copy
+import time
+import hashlib
+import logging
 
+logger = logging.getLogger("free2fa4rdg")
 
-class Config:
-    """ A container class for storing configuration parameters. """
+# Optional file of KEY=VALUE lines overriding the environment, read again on reload
+CONFIG_FILE = os.environ.get("FREE2FA_CONFIG_FILE", "/opt/config/free2fa4rdg_api.env")
+
+# Settings a reload changes in the running process; the others are used once at startup
+RELOADABLE = frozenset({"FREE2FA_TIMEOUT", "AUTO_REG_ENABLED", "BYPASS_ENABLED",
+                        "ALLOW_API_FAILURE_PASS", "PUSH_BATCH_WINDOW"})
+
+
+class ConfigError(Exception):
+    """The configuration file cannot be read or holds an invalid value."""
+
+
+def read_env_file(path):
+    """KEY=VALUE pairs of an env file; empty if the file does not exist."""
+    values = {}
+    try:
+        with open(path, encoding="utf-8") as env_file:
+            lines = env_file.read().splitlines()
+    except FileNotFoundError:
+        return values
+    except OSError as error:
+        raise ConfigError(f"{path}: {error}") from error
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, separator, value = line.removeprefix("export ").partition("=")
+        if not separator:
+            raise ConfigError(f"{path}:{number}: expected KEY=VALUE")
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        values[key.strip()] = value
+    return values
+
+
+class Settings:
+    """ One consistent set of configuration parameters read from an environment mapping. """
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes,too-many-statements
+    # pylint: disable=invalid-name
+
+    def __init__(self, env):
+        # Telegram bot token
+        self.TOKEN = env.get("FREE2FA_TELEGRAM_BOT_TOKEN", "none")
+        # Language of bot interface (ru or en) for users without their own language
+        self.LANGUAGE = env.get("FREE2FA_TELEGRAM_BOT_LANGUAGE", "ru")
+        # Formatted bot messages kept per process (LRU)
+        self.TEMPLATE_CACHE_SIZE = int(env.get("FREE2FA_TEMPLATE_CACHE_SIZE", 1024))
+        # Max message length from user
+        self.MAX_MESSAGE_LENGTH = int(env.get("FREE2FA_MAX_MESSAGE_LENGTH", 100))
+        # Automatically creates users in the base while specifying telegram id 0
+        self.AUTO_REG_ENABLED = env.get(
+            "FREE2FA_AUTO_REG_ENABLED", "false").lower() == "true"
+        # Without confirmation to log in to the server
+        # Allow access to the server for users with telegram ID 0
+        self.BYPASS_ENABLED = env.get(
+            "FREE2FA_BYPASS_ENABLED", "false").lower() == "true"
+        # How many seconds are given to respond
+        # must also change the settings on the side of windows server
+        # specifying the response timeout response radius server that FREE2FA_TIMEOUT +1 (11)
+        self.FREE2FA_TIMEOUT = int(env.get("FREE2FA_TIMEOUT", 10))
+        # Allow all users without a push request if api.telegram.org is unavailable
+        self.ALLOW_API_FAILURE_PASS = env.get(
+            "ALLOW_API_FAILURE_PASS", "false").lower() == "true"
+        # Number of long-lived SQLite connections used by the API handlers
+        self.DB_POOL_SIZE = int(env.get("FREE2FA_DB_POOL_SIZE", 4))
+        # How long (in milliseconds) a query waits for a locked database before failing
+        self.DB_BUSY_TIMEOUT_MS = int(env.get("FREE2FA_DB_BUSY_TIMEOUT_MS", 5000))
+        # How often (in seconds) the in-memory user directory checks the database for changes
+        self.USER_CACHE_REFRESH_INTERVAL = float(env.get("FREE2FA_USER_CACHE_REFRESH", 1))
+        # Telegram Bot API limits: messages per second overall and per chat
+        self.TELEGRAM_RATE_LIMIT = float(env.get("FREE2FA_TELEGRAM_RATE_LIMIT", 30))
+        self.TELEGRAM_CHAT_RATE_LIMIT = float(env.get("FREE2FA_TELEGRAM_CHAT_RATE_LIMIT", 1))
+        # Maximum number of users tracked at once in the short-lived authorization state
+        self.STATE_MAX_ENTRIES = int(env.get("FREE2FA_STATE_MAX_ENTRIES", 10000))
+        # Number of uvicorn worker processes; above 1 the bot runs in its own process
+        self.API_WORKERS = int(env.get("FREE2FA_API_WORKERS", 1))
+        # Unix socket connecting the API workers to the bot process
+        self.IPC_SOCKET = env.get("FREE2FA_IPC_SOCKET", "/tmp/free2fa4rdg_api.sock")
+        # How updates are received from Telegram: "polling" or "webhook"
+        self.TELEGRAM_MODE = env.get("FREE2FA_TELEGRAM_MODE", "polling").lower()
+        # Public HTTPS address forwarded to https://free2fa4rdg_api:5000/telegram/webhook
+        self.WEBHOOK_URL = env.get("FREE2FA_WEBHOOK_URL", "")
+        # Secret Telegram sends in X-Telegram-Bot-Api-Secret-Token (derived from the token if empty)
+        self.WEBHOOK_SECRET = env.get("FREE2FA_WEBHOOK_SECRET") or hashlib.sha256(
+            f"free2fa4rdg-webhook:{self.TOKEN}".encode()).hexdigest()[:32]
+        # Bot API server address; only changed to point the bot at a local or fake server
+        self.TELEGRAM_API_SERVER = env.get("FREE2FA_TELEGRAM_API_SERVER", "")
+        # Database file shared with the admin API
+        self.DATABASE_PATH = env.get("FREE2FA_DATABASE_PATH", "/opt/db/users.db")
+        # Listening port and TLS files of the RADIUS REST API
+        # (empty TLS files: plain HTTP, benchmarks only)
+        self.API_PORT = int(env.get("FREE2FA_API_PORT", 5000))
+        self.SSL_KEYFILE = env.get("FREE2FA_API_SSL_KEYFILE", "/app/certs/free2fa4rdg_api.key")
+        self.SSL_CERTFILE = env.get("FREE2FA_API_SSL_CERTFILE", "/app/certs/free2fa4rdg_api.crt")
+        # Skip the push for a user who approved a logon from the same computer (MS-Machine-Name)
+        self.APPROVAL_CACHE_ENABLED = env.get(
+            "FREE2FA_APPROVAL_CACHE_ENABLED", "false").lower() == "true"
+        # How long (in seconds) an approval is remembered; defaults to the FreeRADIUS cache TTL
+        self.APPROVAL_CACHE_TTL = int(env.get("FREE2FA_APPROVAL_CACHE_TTL",
+                                              env.get("FREE2FA_CACHE_TTL", 32400)))
+        # Maximum number of remembered user/computer pairs
+        self.APPROVAL_CACHE_MAX_ENTRIES = int(
+            env.get("FREE2FA_APPROVAL_CACHE_MAX_ENTRIES", 100000))
+        # SQLite file of the approvals, on the volume shared with the admin API
+        self.APPROVAL_CACHE_PATH = env.get("FREE2FA_APPROVAL_CACHE_PATH", "/opt/db/approvals.db")
+        # Pending requests and decisions are saved here on shutdown and restored on startup
+        self.STATE_SNAPSHOT_PATH = env.get("FREE2FA_STATE_SNAPSHOT_PATH", "/opt/db/api_state.db")
+        # How long (in seconds) a stopping server lets in-flight requests finish
+        self.SHUTDOWN_TIMEOUT = float(
+            env.get("FREE2FA_SHUTDOWN_TIMEOUT", self.FREE2FA_TIMEOUT + 1))
+        # Server profile of the RADIUS REST API. Keep-alive outlives the idle_timeout (120 s)
+        # of the rest module pool, so FreeRADIUS closes idle connections before the server does
+        self.API_KEEPALIVE_TIMEOUT = int(env.get("FREE2FA_API_KEEPALIVE_TIMEOUT", 125))
+        # Length of the listen queue for connections not yet accepted
+        self.API_BACKLOG = int(env.get("FREE2FA_API_BACKLOG", 2048))
+        # Connections plus requests in progress before answering 503 (0: no limit)
+        self.API_LIMIT_CONCURRENCY = int(env.get("FREE2FA_API_LIMIT_CONCURRENCY", 0))
+        # HTTP parser: "auto" (httptools if installed), "h11" or "httptools"
+        self.API_HTTP = env.get("FREE2FA_API_HTTP", "auto").lower()
+        # Event loop: "auto" (uvloop if installed), "asyncio" or "uvloop"
+        self.API_LOOP = env.get("FREE2FA_API_LOOP", "auto").lower()
+        # Circuit breaker of the Bot API client: over the last WINDOW seconds, once at least
+        # MIN_CALLS calls were made and FAILURE_RATE of them failed or took longer than
+        # SLOW_CALL seconds, calls are refused at once for OPEN_SECONDS
+        self.TELEGRAM_BREAKER_ENABLED = env.get(
+            "FREE2FA_TELEGRAM_BREAKER_ENABLED", "true").lower() == "true"
+        self.TELEGRAM_BREAKER_WINDOW = float(env.get("FREE2FA_TELEGRAM_BREAKER_WINDOW", 30))
+        self.TELEGRAM_BREAKER_MIN_CALLS = int(env.get("FREE2FA_TELEGRAM_BREAKER_MIN_CALLS", 5))
+        self.TELEGRAM_BREAKER_FAILURE_RATE = float(
+            env.get("FREE2FA_TELEGRAM_BREAKER_FAILURE_RATE", 0.5))
+        self.TELEGRAM_BREAKER_SLOW_CALL = float(env.get("FREE2FA_TELEGRAM_BREAKER_SLOW_CALL", 3))
+        self.TELEGRAM_BREAKER_OPEN_SECONDS = float(
+            env.get("FREE2FA_TELEGRAM_BREAKER_OPEN_SECONDS", 15))
+        # Outbound push queue: /authorize only queues the push, workers deliver it
+        self.PUSH_QUEUE_SIZE = int(env.get("FREE2FA_PUSH_QUEUE_SIZE", 1000))
+        self.PUSH_WORKERS = int(env.get("FREE2FA_PUSH_WORKERS", 8))
+        # Seconds an unanswered push to a Telegram ID linked to several accounts takes
+        # the pushes of the other accounts as more rows (0 sends each push on its own)
+        self.PUSH_BATCH_WINDOW = float(env.get("FREE2FA_PUSH_BATCH_WINDOW", 5))
+        self.seal()
+
+    def values(self):
+        """The configuration parameters by name."""
+        return {name: value for name, value in vars(self).items() if name.isupper()}
+
+    def seal(self):
+        """Stamp the version (a digest of the values) and the load time."""
+        digest = hashlib.sha256(repr(sorted(self.values().items())).encode())
+        self.version = digest.hexdigest()[:12]
+        self.loaded_at = time.time()
+
+
+def load_settings():
+    """Settings from the environment overlaid with CONFIG_FILE."""
+    try:
+        return Settings({**os.environ, **read_env_file(CONFIG_FILE)})
+    except ValueError as error:
+        raise ConfigError(f"{CONFIG_FILE}: {error}") from error
+
+
+class ConfigProxy(type):
+    """Class attribute reads on Config are served by its current Settings."""
+
+    def __getattr__(cls, name):
+        return getattr(cls.settings, name)
+
+
+class Config(metaclass=ConfigProxy):
+    """
+    The active configuration parameters, read as Config.NAME.
+
+    A read is one attribute lookup on the current Settings object, without a
+    lock. reload() builds a complete new Settings and swaps it in with a single
+    assignment, so code running during a reload sees either the old or the
+    new values, never a mix.
+    """
     # pylint: disable=too-few-public-methods
-    # Telegram bot token
-    TOKEN = os.environ.get("FREE2FA_TELEGRAM_BOT_TOKEN", "none")
-    # Language of bot interface (ru or en)
-    LANGUAGE = os.environ.get("FREE2FA_TELEGRAM_BOT_LANGUAGE", "ru")
-    # Max message length from user
-    MAX_MESSAGE_LENGTH = int(os.environ.get("FREE2FA_MAX_MESSAGE_LENGTH", 100))
-    # Automatically creates users in the base while specifying telegram id 0
-    AUTO_REG_ENABLED = os.environ.get(
-        "FREE2FA_AUTO_REG_ENABLED", "false").lower() == "true"
-    # Without confirmation to log in to the server
-    # Allow access to the server for users with telegram ID 0
-    BYPASS_ENABLED = os.environ.get(
-        "FREE2FA_BYPASS_ENABLED", "false").lower() == "true"
-    # How many seconds are given to respond
-    # must also change the settings on the side of windows server
-    # specifying the response timeout response radius server that FREE2FA_TIMEOUT +1 (11)
-    FREE2FA_TIMEOUT = int(os.environ.get("FREE2FA_TIMEOUT", 10))
-    # Allow all users without a push request if api.telegram.org is unavailable
-    ALLOW_API_FAILURE_PASS = os.environ.get(
-        "ALLOW_API_FAILURE_PASS", "false").lower() == "true"
+    settings = load_settings()
+    # Settings changed in the file that the running process cannot apply
+    restart_required = []
+
+    @classmethod
+    def reload(cls):
+        """
+        Read the environment and CONFIG_FILE again and apply the RELOADABLE settings.
+
+        Other changed settings keep their current value until a restart and are
+        listed in `restart_required`.
+
+        :return: Names of the settings that changed.
+        :raises ConfigError: If the file cannot be read or holds an invalid value;
+                             the current settings stay active.
+        """
+        current = cls.settings
+        current_values = current.values()
+        fresh_values = load_settings().values()
+        changed = sorted(name for name, value in fresh_values.items()
+                         if value != current_values[name])
+        pending = [name for name in changed if name not in RELOADABLE]
+        if pending and pending != cls.restart_required:
+            logger.warning("Configuration changes applied after a restart only: %s",
+                           ", ".join(pending))
+        cls.restart_required = pending
+        changed = [name for name in changed if name in RELOADABLE]
+        if changed:
+            settings = copy.copy(current)
+            for name in changed:
+                setattr(settings, name, fresh_values[name])
+            settings.seal()
+            cls.settings = settings
+        return changed
@@ -0,0 +1,110 @@
+# database.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Long-lived SQLite connection pool shared by the API handlers."""
+
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import aiosqlite
+from metrics import Gauge, Histogram
+
+logger = logging.getLogger("free2fa4rdg")
+
+POOL_WAIT_SECONDS = Histogram(
+    "free2fa_db_pool_wait_seconds",
+    "Time spent waiting for a free database connection")
+QUERY_SECONDS = Histogram(
+    "free2fa_db_query_seconds",
+    "Database query latency by query name", ["query"])
+
+
+class DatabasePool:
+    """A fixed set of aiosqlite connections opened once at startup."""
+
+    def __init__(self, path, size=4, busy_timeout_ms=5000, cached_statements=128):
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle = asyncio.Queue()
+        self._connections = []
+        Gauge("free2fa_db_pool_idle_connections",
+              "Database connections currently available in the pool",
+              callback=self._idle.qsize)
+
+    async def _connect(self):
+        """Open one connection and apply the tuning pragmas."""
+        connection = await aiosqlite.connect(
+            self.path, cached_statements=self.cached_statements)
+        # WAL lets the admin API write while RADIUS lookups keep reading
+        await connection.execute("PRAGMA journal_mode=WAL")
+        await connection.execute("PRAGMA synchronous=NORMAL")
+        await connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        await connection.execute("PRAGMA temp_store=MEMORY")
+        await connection.execute("PRAGMA cache_size=-8000")
+        await connection.execute("PRAGMA mmap_size=67108864")
+        return connection
+
+    async def open(self):
+        """Open every connection of the pool."""
+        for _ in range(self.size):
+            connection = await self._connect()
+            self._connections.append(connection)
+            self._idle.put_nowait(connection)
+        logger.info("Database pool opened with %d connections", self.size)
+
+    async def close(self):
+        """Close every connection of the pool."""
+        for connection in self._connections:
+            await connection.close()
+        self._connections.clear()
+        self._idle = asyncio.Queue()
+        logger.info("Database pool closed")
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a connection from the pool for the duration of the block."""
+        started = time.perf_counter()
+        connection = await self._idle.get()
+        POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+        try:
+            yield connection
+        finally:
+            self._idle.put_nowait(connection)
+
+    async def fetchone(self, name, query, parameters=()):
+        """Run a SELECT and return the first row."""
+        async with self.acquire() as connection:
+            started = time.perf_counter()
+            async with connection.execute(query, parameters) as cursor:
+                row = await cursor.fetchone()
+            QUERY_SECONDS.observe(time.perf_counter() - started, query=name)
+            return row
+
+    async def fetchall(self, name, query, parameters=()):
+        """Run a SELECT and return every row."""
+        async with self.acquire() as connection:
+            started = time.perf_counter()
+            async with connection.execute(query, parameters) as cursor:
+                rows = await cursor.fetchall()
+            QUERY_SECONDS.observe(time.perf_counter() - started, query=name)
+            return rows
+
+    async def execute(self, name, query, parameters=()):
+        """Run a data-modifying statement and commit it."""
+        async with self.acquire() as connection:
+            started = time.perf_counter()
+            try:
+                await connection.execute(query, parameters)
+                await connection.commit()
+            except aiosqlite.Error:
+                await connection.rollback()
+                raise
+            finally:
+                QUERY_SECONDS.observe(time.perf_counter() - started, query=name)
@@ -0,0 +1,132 @@
+# directory.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""In-memory copy of the users table kept current through PRAGMA data_version."""
+
+import asyncio
+import logging
+import aiosqlite
+from metrics import Counter, Gauge
+
+logger = logging.getLogger("free2fa4rdg")
+
+LOOKUPS = Counter("free2fa_user_cache_lookups_total",
+                  "User directory lookups by result", ["result"])
+RELOADS = Counter("free2fa_user_cache_reloads_total",
+                  "Full reloads of the user directory by reason", ["reason"])
+
+
+class UserDirectory:
+    """
+    Maps domain_and_username to (telegram_id, is_bypass, language) without a query per request.
+
+    The whole table is loaded at startup. A dedicated connection polls
+    PRAGMA data_version, which changes whenever another connection (the admin
+    API container included) commits to the database file, and the table is
+    reloaded on change. Edits made through the admin portal are therefore
+    visible after at most one refresh interval. A reverse index lists the
+    accounts linked to each Telegram ID.
+
+    Databases of earlier releases have no language column until the admin
+    API migrates them: every reload checks for it and reads NULL meanwhile.
+    """
+
+    def __init__(self, pool, refresh_interval=1.0):
+        self.pool = pool
+        self.refresh_interval = refresh_interval
+        self._users = {}
+        self._by_telegram_id = {}  # telegram_id -> {domain_and_username}
+        self.language_column = "NULL"  # select expression of users.language
+        self._data_version = None
+        self._watch_connection = None
+        self._watch_task = None
+        Gauge("free2fa_user_cache_entries", "Users held in the in-memory directory",
+              callback=lambda: len(self._users))
+
+    def get(self, username):
+        """Return (telegram_id, is_bypass, language) for the user or None if it is not cached."""
+        entry = self._users.get(username)
+        LOOKUPS.inc(result="hit" if entry is not None else "miss")
+        return entry
+
+    def put(self, username, telegram_id, is_bypass, language=None):
+        """Record a user that was just read from or written to the database."""
+        previous = self._users.get(username)
+        if previous is not None and previous[0] != telegram_id:
+            accounts = self._by_telegram_id.get(previous[0])
+            if accounts is not None:
+                accounts.discard(username)
+                if not accounts:
+                    del self._by_telegram_id[previous[0]]
+        self._users[username] = (telegram_id, is_bypass, language)
+        if telegram_id:
+            self._by_telegram_id.setdefault(telegram_id, set()).add(username)
+
+    def accounts(self, telegram_id):
+        """Usernames linked to the Telegram ID."""
+        return self._by_telegram_id.get(telegram_id, frozenset())
+
+    async def _detect_language_column(self):
+        columns = await self.pool.fetchall("users_columns", "PRAGMA table_info(users)")
+        self.language_column = "language" if any(
+            column[1] == "language" for column in columns) else "NULL"
+
+    async def reload(self, reason="forced"):
+        """Read the whole users table and swap it in one step."""
+        await self._detect_language_column()
+        rows = await self.pool.fetchall(
+            "load_users",
+            "SELECT domain_and_username, telegram_id, is_bypass, "
+            f"{self.language_column} FROM users")
+        users = {}
+        by_telegram_id = {}
+        for username, telegram_id, is_bypass, language in rows:
+            users[username] = (telegram_id, is_bypass, language)
+            if telegram_id:
+                by_telegram_id.setdefault(telegram_id, set()).add(username)
+        self._users = users
+        self._by_telegram_id = by_telegram_id
+        RELOADS.inc(reason=reason)
+        logger.info("User directory loaded: %d users (%s)", len(self._users), reason)
+
+    async def _read_data_version(self):
+        async with self._watch_connection.execute("PRAGMA data_version") as cursor:
+            row = await cursor.fetchone()
+            return row[0]
+
+    async def _watch(self):
+        """Reload the directory whenever the database file changes."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                data_version = await self._read_data_version()
+                if data_version != self._data_version:
+                    await self.reload("changed")
+                    self._data_version = data_version
+            except aiosqlite.Error as db_err:
+                logger.warning("User directory refresh failed: %s", db_err)
+
+    async def start(self):
+        """Load the directory and start watching for changes."""
+        self._watch_connection = await aiosqlite.connect(self.pool.path)
+        try:
+            self._data_version = await self._read_data_version()
+            await self.reload("startup")
+        except aiosqlite.Error as db_err:
+            # The admin API may not have created the table yet; retry on the next change
+            self._data_version = None
+            logger.warning("User directory is empty at startup: %s", db_err)
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Stop watching and release the dedicated connection."""
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._watch_connection:
+            await self._watch_connection.close()
+            self._watch_connection = None
@@ -15,6 +15,11 @@ MESSAGES = {
     "was_auth_request": ("❌ A login attempt was made but was rejected due to a timeout. "
                          "If you have not attempted to log in, reject the request and "
                          "contact your administrator."),
+    "auth_request_batch": ("🔐 Authorization requests for several of your accounts. "
+                           "Approve or reject each one. If you did not attempt to log in, "
+                           "reject the request and contact the administrator."),
     "action_accept": "\U0001f7e2 Approve",
-    "action_reject": "\U0001f534 Reject"
+    "action_reject": "\U0001f534 Reject",
+    "action_accept_account": "\U0001f7e2 {}",
+    "action_reject_account": "\U0001f534 {}"
 }
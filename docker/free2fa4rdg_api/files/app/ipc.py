@@ -0,0 +1,151 @@
+# ipc.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Unix socket channel between the bot process and the API worker processes."""
+
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger("free2fa4rdg")
+
+# Delay before an API worker retries connecting to the bot process
+RECONNECT_DELAY = 0.5
+# Largest message accepted on the socket (webhook updates are forwarded as is)
+STREAM_LIMIT = 1024 * 1024
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+class IpcServer:
+    """
+    Runs in the bot process. API workers send requests (one JSON object per
+    line) that are passed to `handler`; events such as user decisions are
+    broadcast to every connected worker. `on_connect`, if given, returns the
+    events a newly connected worker has missed.
+    """
+
+    def __init__(self, path, handler, on_connect=None):
+        self.path = path
+        self.handler = handler
+        self.on_connect = on_connect
+        self._server = None
+        self._writers = set()
+        self._tasks = set()
+
+    async def start(self):
+        """Listen on the Unix socket, replacing a stale one left by a crash."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._serve, path=self.path, limit=STREAM_LIMIT)
+        logger.info("IPC server listening on %s", self.path)
+
+    async def _serve(self, reader, writer):
+        self._writers.add(writer)
+        if self.on_connect is not None:
+            for message in self.on_connect():
+                writer.write(_encode(message))
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self.handler(json.loads(line)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (ConnectionError, ValueError) as error:
+            # ValueError: bad JSON, or a line above STREAM_LIMIT
+            logger.warning("IPC worker connection dropped: %s", error)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def broadcast(self, message):
+        """Send an event to every connected worker."""
+        data = _encode(message)
+        for writer in list(self._writers):
+            if writer.is_closing():
+                self._writers.discard(writer)
+                continue
+            writer.write(data)
+
+    async def stop(self):
+        """Stop listening and disconnect the workers."""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+class IpcClient:
+    """
+    Runs in an API worker; keeps a connection to the bot process and
+    dispatches its events. `on_connect`, if given, returns the requests to
+    send each time the connection is (re)established.
+    """
+
+    def __init__(self, path, handler, on_connect=None):
+        self.path = path
+        self.handler = handler
+        self.on_connect = on_connect
+        self._writer = None
+        self._task = None
+
+    @property
+    def connected(self):
+        """Whether requests can currently be delivered to the bot process."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self):
+        """Start the connection loop in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(
+                    self.path, limit=STREAM_LIMIT)
+                logger.info("Connected to the bot process over %s", self.path)
+                if self.on_connect is not None:
+                    for message in self.on_connect():
+                        self._writer.write(_encode(message))
+                while line := await reader.readline():
+                    self._dispatch(line)
+                logger.warning("Bot process closed the IPC connection")
+            except (OSError, ValueError) as error:
+                # ValueError: a line above STREAM_LIMIT, the stream cannot be resynchronized
+                logger.warning("IPC connection to the bot process failed: %s", error)
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _dispatch(self, line):
+        # One bad event must not stop the worker from hearing the next ones
+        try:
+            self.handler(json.loads(line))
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception("IPC event from the bot process not applied: %s", error)
+
+    async def send(self, message):
+        """Deliver a request to the bot process; raises ConnectionError when it is unreachable."""
+        if not self.connected:
+            raise ConnectionError("bot process is not connected")
+        self._writer.write(_encode(message))
+        await self._writer.drain()
+
+    async def stop(self):
+        """Close the connection and stop reconnecting."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -8,42 +8,154 @@
 """The main module includes a bot and an api."""
 
 import time
+import json
+import hmac
+import functools
 import logging
+import signal
 import asyncio
+import multiprocessing
+from contextlib import asynccontextmanager
 import aiosqlite
 import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from aiogram import Bot, types, Dispatcher
 from aiogram.dispatcher.router import Router
 from aiogram.filters import Command
 from aiogram import exceptions as aiogram_exceptions
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.client.session.aiohttp import AiohttpSession
-from config import Config
-
-
-if Config.LANGUAGE == 'ru':
-    import ru_ru as loc
-elif Config.LANGUAGE == 'en':
-    import en_en as loc
-else:
-    # default value if language is not defined
-    import en_en as loc
+from aiogram.client.telegram import TelegramAPIServer, PRODUCTION
+from config import Config, ConfigError
+from state import TTLStore
+from pending import PendingRequests
+from templates import MessageTemplates
+from snapshot import save_snapshot, load_snapshot
+from timers import TimerWheel
+from database import DatabasePool
+from directory import UserDirectory
+from approvals import ApprovalCache
+from ipc import IpcServer, IpcClient
+from singleflight import SingleFlight
+from outbox import PushQueue, QueueFullError
+from breaker import CircuitBreaker, CircuitBreakerMiddleware
+from metrics import render_metrics, Gauge, Histogram
+from telemetry import (TelegramMetricsMiddleware, LoopLagMonitor,
+                       H11MetricsProtocol, HttpToolsMetricsProtocol)
+from ratelimit import (TelegramRateLimiter, PRIORITY_AUTH,
+                       PRIORITY_INTERACTIVE, PRIORITY_CLEANUP)
+
+try:
+    import uvloop
+except ImportError:  # uvloop is optional
+    uvloop = None
 
 router = Router()
 
+# Bot and application configuration
+DATABASE_PATH = Config.DATABASE_PATH
+
+db_pool = DatabasePool(DATABASE_PATH, size=Config.DB_POOL_SIZE,
+                       busy_timeout_ms=Config.DB_BUSY_TIMEOUT_MS)
+user_directory = UserDirectory(db_pool, Config.USER_CACHE_REFRESH_INTERVAL)
+approval_cache = (ApprovalCache(Config.APPROVAL_CACHE_PATH, Config.APPROVAL_CACHE_TTL,
+                                Config.APPROVAL_CACHE_MAX_ENTRIES,
+                                Config.USER_CACHE_REFRESH_INTERVAL)
+                  if Config.APPROVAL_CACHE_ENABLED else None)
+
+# Multi-worker mode: the bot process owns the server side, every API worker a client
+ipc_server = None
+ipc_client = None
+# Single-process mode: the aiogram task running next to the API server
+bot_task = None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Open the shared database pool and the user directory for the lifetime of the API server."""
+    global ipc_client  # pylint: disable=global-statement
+    loop_lag_monitor.start()
+    await db_pool.open()
+    await user_directory.start()
+    if approval_cache is not None:
+        await approval_cache.start(Config.DB_BUSY_TIMEOUT_MS)
+    if Config.API_WORKERS > 1:
+        ipc_client = IpcClient(Config.IPC_SOCKET, handle_ipc_event,
+                               on_connect=client_key_events)
+        await ipc_client.start()
+    yield
+    # Runs after uvicorn has drained the requests in flight, the bot taking taps meanwhile
+    if bot_task is not None:
+        await stop_bot(bot_task)
+    if ipc_client is not None:
+        await ipc_client.stop()
+    if approval_cache is not None:
+        await approval_cache.stop()
+    await user_directory.stop()
+    await db_pool.close()
+    await loop_lag_monitor.stop()
+
 # FastAPI and aiogram initialization
-app = FastAPI()
-bot = Bot(token=Config.TOKEN, session=AiohttpSession(timeout=5))
+app = FastAPI(lifespan=lifespan)
+telegram_api = (TelegramAPIServer.from_base(Config.TELEGRAM_API_SERVER)
+                if Config.TELEGRAM_API_SERVER else PRODUCTION)
+bot = Bot(token=Config.TOKEN, session=AiohttpSession(api=telegram_api, timeout=5))
+bot.session.middleware(TelegramMetricsMiddleware())
+
+
+def publish_breaker_status(status):
+    """Bot process side: tell the API workers about a circuit breaker state change"""
+    if ipc_server is not None:
+        ipc_server.broadcast({"op": "breaker", "status": status})
+
+
+telegram_breaker = CircuitBreaker(window=Config.TELEGRAM_BREAKER_WINDOW,
+                                  min_calls=Config.TELEGRAM_BREAKER_MIN_CALLS,
+                                  failure_rate=Config.TELEGRAM_BREAKER_FAILURE_RATE,
+                                  slow_call=Config.TELEGRAM_BREAKER_SLOW_CALL,
+                                  open_seconds=Config.TELEGRAM_BREAKER_OPEN_SECONDS,
+                                  on_change=publish_breaker_status)
+if Config.TELEGRAM_BREAKER_ENABLED:
+    bot.session.middleware(CircuitBreakerMiddleware(telegram_breaker))
+# API worker side: the breaker state last published by the bot process
+remote_breaker_status = {"state": "unknown"}
 dp = Dispatcher()
 dp.include_router(router)
-
-# Other dictionaries
-search_state = {}
-auth_requests = {}
-last_message_info = {}
+message_limiter = TelegramRateLimiter(global_rate=Config.TELEGRAM_RATE_LIMIT,
+                                      chat_rate=Config.TELEGRAM_CHAT_RATE_LIMIT)
+# Owns every delayed bot action: timeout notices and message deletion
+timer_wheel = TimerWheel()
+
+# Short-lived state: user decisions and the pushes waiting for a tap
+auth_requests = TTLStore("auth_requests", ttl=Config.FREE2FA_TIMEOUT,
+                         maxsize=Config.STATE_MAX_ENTRIES)
+# Users whose stored permit comes from their own tap, not from ALLOW_API_FAILURE_PASS
+user_approvals = TTLStore("user_approvals", ttl=Config.FREE2FA_TIMEOUT,
+                          maxsize=Config.STATE_MAX_ENTRIES)
+pending_requests = PendingRequests(maxsize=Config.STATE_MAX_ENTRIES)
+# Pushes waiting for their chat's message to be delivered: telegram_id -> [PendingRequest]
+push_batches = {}
+# Updates received through the webhook that are still being processed
+webhook_tasks = set()
+# Concurrent calls for the same user share one lookup, one wait and one push
+user_lookups = SingleFlight("user_lookup")
+decision_waits = SingleFlight("decision_wait")
+auth_pushes = SingleFlight("auth_push")
+loop_lag_monitor = LoopLagMonitor()
+
+REQUEST_SECONDS = Histogram("free2fa_request_seconds",
+                            "RADIUS REST call latency by endpoint and outcome",
+                            ["endpoint", "outcome"])
+DECISION_WAIT_SECONDS = Histogram("free2fa_decision_wait_seconds",
+                                  "Time /authenticate waited for the user's decision",
+                                  ["decision"])
+AUTHENTICATE_OVERHEAD_SECONDS = Histogram(
+    "free2fa_authenticate_overhead_seconds",
+    "Time /authenticate spent before waiting for the decision (key check, user lookup)")
+PUSH_BATCH_SIZE = Histogram("free2fa_push_batch_size",
+                            "Accounts on a push message after another account joined it",
+                            buckets=(1, 2, 3, 5, 10, 20))
 
 # Server Responses
 
@@ -60,16 +172,41 @@ def response_403():
 
 def response_404():
     """Response api code 404 Not Found"""
-    return JSONResponse(status_code=403, content={"Reply-Message": "Not Found"})
+    response = JSONResponse(status_code=403, content={"Reply-Message": "Not Found"})
+    # FreeRADIUS only needs the 403; metrics keep the actual outcome
+    response.outcome = "404"
+    return response
 
 
 def response_408():
     """Response api code 408 Timeout"""
-    return JSONResponse(status_code=403, content={"Reply-Message": "Timeout"})
+    response = JSONResponse(status_code=403, content={"Reply-Message": "Timeout"})
+    response.outcome = "408"
+    return response
+
+
+def observe_request(endpoint):
+    """Record the latency of an API handler by the outcome of its response"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            response = await handler(*args, **kwargs)
+            outcome = getattr(response, "outcome", str(response.status_code))
+            REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                    endpoint=endpoint, outcome=outcome)
+            return response
+        return wrapper
+    return decorator
 
 
 class ClientKeyStorage:
-    """API key control class"""
+    """
+    API key control class.
+
+    With several API workers the bot process holds the key: a worker reports
+    the key it installed and receives the one the bot process knows.
+    """
     _client_key = None
 
     @classmethod
@@ -85,44 +222,98 @@ class ClientKeyStorage:
             logger.warning("Invalid API KEY")
             return "invalid"
 
+    @classmethod
+    def is_valid(cls, key):
+        """Checks the key without installing it."""
+        return cls._client_key is not None and cls._client_key == key
+
+    @classmethod
+    def get_key(cls):
+        """The installed key, or None."""
+        return cls._client_key
+
+    @classmethod
+    def replace_key(cls, key):
+        """Install the key published by the bot process."""
+        if cls._client_key != key:
+            cls._client_key = key
+            logger.info("API KEY received from the bot process")
+
+
+async def share_client_key(key):
+    """API worker side: hand a key installed here to the bot process for the other workers."""
+    if ipc_client is None:
+        return
+    try:
+        await ipc_client.send({"op": "client_key", "key": key})
+    except ConnectionError as ipc_err:
+        # Sent again as soon as the worker connects
+        logger.debug("API KEY not shared yet: %s", ipc_err)
+
+
+def client_key_events():
+    """Key message exchanged over IPC when a connection is (re)established"""
+    key = ClientKeyStorage.get_key()
+    return [{"op": "client_key", "key": key}] if key is not None else []
+
 
 class AuthorizeRequest(BaseModel):
     """Defining a Pydantic model class for a query /authorize"""
     user_name: str
     client_key: str
+    # MS-Machine-Name of the connecting computer, forwarded by the rest module
+    machine_name: str = ""
 
 
 class AuthenticateRequest(BaseModel):
     """Defining a Pydantic model class for a query /authenticate"""
     user_name: str
     client_key: str
+    machine_name: str = ""
+
+
+class ClientKeyRequest(BaseModel):
+    """Defining a Pydantic model class for service queries"""
+    client_key: str
 
 
-class MessageLimiter:
-    """Configuring the message limit and queue."""
-    # The Telegram API limits 30 messages per second, if more than that, it pauses for 5 seconds.
-    max_messages_per_second = 30
-    message_count = 0
-    message_count_lock = asyncio.Lock()
+class AuthWaiters:
+    """Registry of /authenticate requests waiting for a user's decision."""
+    # username -> [asyncio.Event, number of waiting coroutines]
+    _waiters = {}
 
     @classmethod
-    async def reset_message_count(cls):
-        """Reset the count of messages every second."""
-        while True:
-            await asyncio.sleep(1)
-            cls.message_count = 0
+    async def wait(cls, username, timeout):
+        """Wait until a decision for the user is published or the timeout expires."""
+        entry = cls._waiters.get(username)
+        if entry is None:
+            entry = cls._waiters[username] = [asyncio.Event(), 0]
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and cls._waiters.get(username) is entry:
+                del cls._waiters[username]
+
+    @classmethod
+    def notify(cls, username):
+        """Wake up every coroutine waiting for the user's decision."""
+        entry = cls._waiters.pop(username, None)
+        if entry is not None:
+            entry[0].set()
 
     @classmethod
-    async def wait_for_message_slot(cls):
-        """Wait until there is a free slot for sending a message."""
-        async with cls.message_count_lock:
-            while cls.message_count >= cls.max_messages_per_second:
-                await asyncio.sleep(1)
-            cls.message_count += 1
+    def count(cls):
+        """Number of users with /authenticate requests waiting."""
+        return len(cls._waiters)
 
 
-# Bot and application configuration
-DATABASE_PATH = '/opt/db/users.db'
+Gauge("free2fa_auth_waiting_users", "Users with /authenticate requests waiting for a decision",
+      callback=AuthWaiters.count)
+
 
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 logging.basicConfig(level=logging.INFO, format=LOG_FORMAT,
@@ -147,95 +338,133 @@ logging_config = {
 
 
 async def find_user_by_domain(domain_and_username):
+    """Searching for a user in the directory, then in the database"""
+    cached = user_directory.get(domain_and_username)
+    if cached is not None:
+        return cached
+    return await user_lookups.do(domain_and_username, query_user_by_domain, domain_and_username)
+
+
+async def query_user_by_domain(domain_and_username):
     """Searching for a user in the database"""
     logger.debug("Search for a user with the name: %s", domain_and_username)
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
-        logger.debug("Successful connection to the database")
-        query = (
-            "SELECT telegram_id, is_bypass "
-            "FROM users "
-            "WHERE domain_and_username = ?"
-        )
-        async with db_connection.execute(query, (domain_and_username,)) as cursor:
-            result = await cursor.fetchone()
-            if result:
-                telegram_id, is_bypass = result
-                logger.debug("Found User: %s tg id: %s is_bypass: %s",
-                             domain_and_username, telegram_id, is_bypass)
-                return telegram_id, is_bypass
-            logger.warning("User %s not found", domain_and_username)
-        return None, None
+    query = (
+        f"SELECT telegram_id, is_bypass, {user_directory.language_column} "
+        "FROM users "
+        "WHERE domain_and_username = ?"
+    )
+    result = await db_pool.fetchone("find_user", query, (domain_and_username,))
+    if result:
+        telegram_id, is_bypass, language = result
+        logger.debug("Found User: %s tg id: %s is_bypass: %s",
+                     domain_and_username, telegram_id, is_bypass)
+        user_directory.put(domain_and_username, telegram_id, is_bypass, language)
+        return telegram_id, is_bypass, language
+    logger.warning("User %s not found", domain_and_username)
+    return None, None, None
 
 
 async def create_new_user(domain_and_username, telegram_id, is_bypass=False):
     """Create a new user in the database"""
-    async with aiosqlite.connect(DATABASE_PATH) as db_connection:
-        query = (
-            "INSERT INTO users (domain_and_username, telegram_id, is_bypass) "
-            "VALUES (?, ?, ?)"
-        )
-        try:
-            await db_connection.execute(query, (domain_and_username, telegram_id, is_bypass))
-            await db_connection.commit()
-            return True
-        except aiosqlite.IntegrityError:
-            return False
+    query = (
+        "INSERT INTO users (domain_and_username, telegram_id, is_bypass) "
+        "VALUES (?, ?, ?)"
+    )
+    try:
+        await db_pool.execute("create_user", query,
+                              (domain_and_username, telegram_id, is_bypass))
+        user_directory.put(domain_and_username, telegram_id, is_bypass)
+        return True
+    except aiosqlite.IntegrityError:
+        return False
 
 
 # ====api===
 
 @app.post("/authenticate")
+@observe_request("authenticate")
 async def authenticate_user(request: AuthenticateRequest):
     """Authenticate, waiting for a response."""
+    started = time.perf_counter()
     # Checking API KEY
     client_key = request.client_key
     key_status = ClientKeyStorage.verify_and_set_key(client_key)
 
     if key_status == "invalid":
         return response_403()
+    if key_status == "set":
+        await share_client_key(client_key)
     if key_status == "set" and request.user_name == "key":
         return response_200()
 
     normalized_username = request.user_name.lower()
     logger.debug("app.post authenticate  User verification: %s",
                  normalized_username)
-    telegram_id, is_bypass = await find_user_by_domain(normalized_username)
+    telegram_id, is_bypass, _ = await find_user_by_domain(normalized_username)
     logger.debug("app.post authenticate  Found Telegram ID: %s", telegram_id)
 
     if telegram_id and telegram_id != 0 and not is_bypass:
-        return await handle_auth_with_wait(normalized_username)
+        if is_recently_approved(normalized_username, request.machine_name):
+            return response_200()
+        AUTHENTICATE_OVERHEAD_SECONDS.observe(time.perf_counter() - started)
+        return await handle_auth_with_wait(normalized_username, request.machine_name)
     else:
         return await handle_auto_reg_or_bypass(normalized_username, telegram_id, is_bypass)
 
 
-async def handle_auth_with_wait(normalized_username):
+async def handle_auth_with_wait(normalized_username, machine_name=""):
     """
     Waits for user authentication confirmation. Sends an authentication request
     and waits for a response for the specified time. Returns the appropriate HTTP response
     depending on the authentication result.
 
     :param normalized_username: Normalized username.
+    :param machine_name: Computer the logon comes from, remembered on approval.
     :return: HTTPResponse depending on the authentication result.
     """
-    wait_time = 1  # Initial waiting time
-    max_wait_time = Config.FREE2FA_TIMEOUT
-
-    while wait_time <= max_wait_time and normalized_username not in auth_requests:
-        logger.debug("Waiting for a response for %s seconds %.1f from %d",
-                     normalized_username, wait_time, max_wait_time)
-        await asyncio.sleep(0.5)
-        wait_time += 0.5
-
-    if auth_requests.get(normalized_username):
+    wait_started = time.perf_counter()
+    decision, by_user = await decision_waits.do(normalized_username, wait_for_decision,
+                                                normalized_username)
+    DECISION_WAIT_SECONDS.observe(
+        time.perf_counter() - wait_started,
+        decision={True: "permit", False: "reject"}.get(decision, "timeout"))
+    if decision:
         logger.info("Authentication request accepted by user %s",
                     normalized_username)
-        asyncio.create_task(clear_auth_request(normalized_username))
+        # A pass granted by ALLOW_API_FAILURE_PASS must not outlive the outage
+        if approval_cache is not None and by_user:
+            await approval_cache.add(normalized_username, machine_name)
         return response_200()
-    else:
-        logger.info(
-            "Authentication request rejected or timeout for user: %s", normalized_username)
-        asyncio.create_task(clear_auth_request(normalized_username))
-        return response_403() if normalized_username in auth_requests else response_408()
+    logger.info(
+        "Authentication request rejected or timeout for user: %s", normalized_username)
+    return response_403() if decision is False else response_408()
+
+
+async def wait_for_decision(normalized_username):
+    """
+    Waits for the user's decision, shared by all concurrent /authenticate calls for the user.
+
+    :param normalized_username: Normalized username.
+    :return: (True if permitted, False if rejected, None on timeout;
+              whether the permit is the user's own tap).
+    """
+    # Same budget as the former 0.5 s polling loop: answer before FreeRADIUS gives up
+    max_wait_time = Config.FREE2FA_TIMEOUT - 0.5
+
+    if normalized_username not in auth_requests:
+        logger.debug("Waiting for a response for %s up to %.1f seconds",
+                     normalized_username, max_wait_time)
+        await AuthWaiters.wait(normalized_username, max_wait_time)
+    decision = auth_requests.get(normalized_username)
+    if decision is None:
+        # Nobody waits for the push any more: a late tap must not let in the next logon
+        await abandon_auth_request(normalized_username)
+        return None, False
+    # Keep the decision briefly for a retry arriving right after this answer
+    auth_requests.expire(normalized_username, 1)
+    by_user = user_approvals.get(normalized_username, False)
+    user_approvals.expire(normalized_username, 1)
+    return decision, by_user
 
 
 async def handle_auto_reg_or_bypass(normalized_username, telegram_id, is_bypass):
@@ -267,6 +496,7 @@ async def handle_auto_reg_or_bypass(normalized_username, telegram_id, is_bypass)
 
 
 @app.post("/authorize")
+@observe_request("authorize")
 async def authorize_user(request: AuthorizeRequest):
     """Authorization, database search and request sending."""
     client_key = request.client_key
@@ -275,19 +505,24 @@ async def authorize_user(request: AuthorizeRequest):
     # API key status processing
     if key_status == "invalid":
         return response_403()
+    if key_status == "set":
+        await share_client_key(client_key)
     if key_status == "set" and request.user_name == "key":
         return response_200()
     if request.user_name == "":
         return response_404()
 
     normalized_username = request.user_name.lower()
-    telegram_id, is_bypass = await find_user_by_domain(normalized_username)
+    telegram_id, is_bypass, language = await find_user_by_domain(normalized_username)
     logger.debug(
         f"Start for {normalized_username} found Telegram ID: {telegram_id}")
 
     if is_bypass or telegram_id or Config.AUTO_REG_ENABLED:
         if telegram_id and not is_bypass:
-            await send_auth_request(telegram_id, normalized_username)
+            if not is_recently_approved(normalized_username, request.machine_name):
+                # Several accounts on one chat: their pushes may share a message
+                batch = len(user_directory.accounts(telegram_id)) > 1
+                await request_auth_push(telegram_id, normalized_username, language, batch)
         elif Config.AUTO_REG_ENABLED and not telegram_id:
             logger.debug(f"Auto registration user: {normalized_username}")
             await create_new_user(normalized_username, 0)
@@ -297,61 +532,320 @@ async def authorize_user(request: AuthorizeRequest):
     return response_404()
 
 
+def is_recently_approved(normalized_username, machine_name):
+    """Whether the approval cache lets the user in from this computer without a push."""
+    if approval_cache is None or not approval_cache.get(normalized_username, machine_name):
+        return False
+    logger.info("User %s approved earlier from %s, no push needed",
+                normalized_username, machine_name)
+    return True
+
+
+def resolve_auth_request(normalized_username, result, ttl=None, by_user=False):
+    """
+    Store the user's decision and wake up the waiting /authenticate requests.
+
+    `by_user` marks a permit tapped by the user: only those are remembered
+    by the approval cache.
+    """
+    auth_requests.set(normalized_username, result, ttl)
+    if result and by_user:
+        user_approvals.set(normalized_username, True, ttl)
+    else:
+        user_approvals.pop(normalized_username)
+    AuthWaiters.notify(normalized_username)
+    if ipc_server is not None:
+        ipc_server.broadcast({"op": "decision", "username": normalized_username,
+                              "result": result, "ttl": ttl, "by_user": by_user})
+
+
+async def abandon_auth_request(normalized_username):
+    """The logon timed out: withdraw its push in this process or in the bot process."""
+    if ipc_client is None:
+        drop_auth_requests(normalized_username)
+        return
+    # A decision broadcast while the request travels is dropped by the bot process too
+    auth_requests.pop(normalized_username)
+    try:
+        await ipc_client.send({"op": "abandon", "username": normalized_username})
+    except ConnectionError as ipc_err:
+        logger.warning("Bot process unavailable: %s", ipc_err)
+
+
+def drop_auth_requests(normalized_username):
+    """Forget the user's pushes and any decision that came after the logon gave up."""
+    abandoned = pending_requests.pop_user(normalized_username)
+    auth_requests.pop(normalized_username)
+    if ipc_server is not None:
+        ipc_server.broadcast({"op": "forget", "username": normalized_username})
+    if abandoned:
+        logger.info("Logon of %s timed out, request %s withdrawn", normalized_username,
+                    ", ".join(pending.request_id for pending in abandoned))
+        timer_wheel.schedule(0, withdraw_auth_messages, abandoned)
+
+
+def fail_auth_request(normalized_username, reason):
+    """The push cannot reach Telegram: decide for the waiting /authenticate by policy."""
+    if Config.ALLOW_API_FAILURE_PASS:
+        resolve_auth_request(normalized_username, True)
+        logger.warning("Allow access %s by API failure %s", normalized_username, reason)
+    else:
+        # Nobody can answer a push that was not sent: reject now, not at the timeout
+        resolve_auth_request(normalized_username, False, ttl=1)
+        logger.warning("Reject %s by API failure %s", normalized_username, reason)
+
+
+def reject_auth_request(normalized_username, reason):
+    """The push was never handed to Telegram: reject, whatever the API failure policy."""
+    resolve_auth_request(normalized_username, False, ttl=1)
+    logger.warning("Reject %s: %s", normalized_username, reason)
+
+
+async def request_auth_push(telegram_id, normalized_username, language=None, batch=False):
+    """Queue the push in this process or hand it over to the bot process."""
+    if ipc_client is None:
+        queue_auth_request(telegram_id, normalized_username, language, batch)
+        return
+    try:
+        await ipc_client.send({"op": "push", "telegram_id": telegram_id,
+                               "username": normalized_username, "language": language,
+                               "batch": batch})
+    except ConnectionError as ipc_err:
+        # The push never left this worker: an unreachable bot process does not fail open
+        reject_auth_request(normalized_username, f"bot process unavailable: {ipc_err}")
+
+
+def queue_auth_request(telegram_id, normalized_username, language=None, batch=False):
+    """Hand the push to the outbound queue without waiting for Telegram or the rate limiter."""
+    try:
+        push_queue.submit(normalized_username, telegram_id, normalized_username, language, batch)
+    except QueueFullError as full:
+        # Overload is not a Telegram failure: ALLOW_API_FAILURE_PASS must not open the door
+        reject_auth_request(normalized_username, full)
+
+
+def handle_ipc_event(message):
+    """API worker side: apply an event published by the bot process."""
+    global remote_breaker_status  # pylint: disable=global-statement
+    if message.get("op") == "decision":
+        resolve_auth_request(message["username"], message["result"], message.get("ttl"),
+                             message.get("by_user", False))
+    elif message.get("op") == "forget":
+        auth_requests.pop(message["username"])
+    elif message.get("op") == "client_key":
+        ClientKeyStorage.replace_key(message["key"])
+    elif message.get("op") == "reload_cache":
+        timer_wheel.schedule(0, user_directory.reload, "forced")
+    elif message.get("op") == "breaker":
+        remote_breaker_status = message["status"]
+    elif message.get("op") == "reload_config":
+        reload_config("bot process")
+
+
+async def handle_ipc_request(message):
+    """Bot process side: serve a request from an API worker."""
+    if message.get("op") == "reload_config":
+        reload_config("API worker")
+    elif message.get("op") == "push":
+        queue_auth_request(message["telegram_id"], message["username"],
+                           message.get("language"), message.get("batch", False))
+    elif message.get("op") == "client_key":
+        # The first key reported wins; every worker gets the one kept here
+        ClientKeyStorage.verify_and_set_key(message["key"])
+        ipc_server.broadcast(client_key_events()[0])
+    elif message.get("op") == "reload_cache":
+        ipc_server.broadcast({"op": "reload_cache"})
+    elif message.get("op") == "abandon":
+        drop_auth_requests(message["username"])
+    elif message.get("op") == "update":
+        await feed_telegram_update(message["update"])
+
+
 # ==========BOT================
+# callback_data prefixes of the request buttons, followed by the request ID
+CALLBACK_PERMIT = "p:"
+CALLBACK_REJECT = "r:"
+
+templates = MessageTemplates(Config.LANGUAGE, CALLBACK_PERMIT, CALLBACK_REJECT,
+                             cache_size=Config.TEMPLATE_CACHE_SIZE)
+
+
 @router.message(Command(commands=['start']))
 async def cmd_start(message: types.Message):
     """Authorization, database search and request sending"""
     user_telegram_id = message.from_user.id
     logger.info("%s request /start", user_telegram_id)
-    start_message = (loc.MESSAGES["start"].format(user_telegram_id) + " " +
-                     loc.MESSAGES["register_with_admin"])
+    # Not registered yet: answer in the language of the Telegram client
+    language = message.from_user.language_code
+    start_message = (templates.text("start", language, user_telegram_id) + " " +
+                     templates.text("register_with_admin", language))
     await answer_limited_message(message, start_message)
 
 
-async def send_auth_request(telegram_id, domain_and_username):
+async def send_auth_request(telegram_id, domain_and_username, language=None, batch=False):
+    """Send an authorization request unless one for the user is already being sent."""
+    normalized_username = domain_and_username.lower()
+    await auth_pushes.do(normalized_username, deliver_auth_request,
+                         telegram_id, domain_and_username, language, batch)
+
+
+async def deliver_auth_request(telegram_id, domain_and_username, language=None, batch=False):
     """Send an authorization confirmation request to the chat bot using the virtual keyboard."""
     normalized_username = domain_and_username.lower()
-    current_time = time.time()
-    if normalized_username in last_message_info:
-        last_time, _, message_task = last_message_info[normalized_username]
-        result = int(current_time - last_time)
+    previous = pending_requests.latest(normalized_username)
+    if previous is not None:
+        result = int(time.time() - previous.sent_at)
         if result < Config.FREE2FA_TIMEOUT:
             # If the message was sent less than X seconds ago, skip sending a new one
             logger.info("%s %d Block new msg", normalized_username, result)
             return
-    logger.info("Sending an authorization request for"
-                "%s telegram id %s", normalized_username, telegram_id)
-    markup = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=loc.MESSAGES["action_accept"],
-                              callback_data=f"permit:{normalized_username}"),
-         InlineKeyboardButton(text=loc.MESSAGES["action_reject"],
-                              callback_data=f"reject:{normalized_username}")]
-    ])
-
-    # Sending a new message and saving the sending time
+    pending = pending_requests.create(normalized_username, telegram_id, language)
+    if not batch or Config.PUSH_BATCH_WINDOW <= 0:
+        await send_auth_message(telegram_id, [pending])
+        return
+    # Several accounts on one chat: the first push goes out at once, the next ones
+    # become rows of its message instead of messages of their own
+    waiting = push_batches.get(telegram_id)
+    if waiting is not None:
+        # The chat's message is still on its way: join it once it is delivered
+        waiting.append(pending)
+        return
+    message_id = open_auth_message(telegram_id)
+    if message_id is not None:
+        await join_auth_message(telegram_id, message_id, [pending])
+        return
+    push_batches[telegram_id] = []
     try:
-        sent_message = await send_limited_message(telegram_id, loc.MESSAGES["auth_request"], markup)
-        message_task = asyncio.create_task(
-            send_message_after_delay(
-                telegram_id,
-                Config.FREE2FA_TIMEOUT + 1,
-                loc.MESSAGES["was_auth_request"].format(domain_and_username),
-                normalized_username,
-                sent_message.message_id
-            )
-        )
-        logger.debug("last_message_info for %s", normalized_username)
-        last_message_info[normalized_username] = (current_time,
-                                                  sent_message.message_id, message_task)
-    except aiogram_exceptions.TelegramBadRequest as req_err:
-        logger.warning(
-            "TelegramBadRequest while sending message to %s: %s", telegram_id, req_err)
-    except (asyncio.TimeoutError, aiogram_exceptions.TelegramNetworkError) as network_err:
-        logger.warning("Error when sending message: %s", network_err)
-        if Config.ALLOW_API_FAILURE_PASS:
-            auth_requests[normalized_username] = True
-            logger.warning("Allow access %s by API failure %s",
-                           normalized_username, network_err)
+        await send_auth_message(telegram_id, [pending])
+    finally:
+        waiting = push_batches.pop(telegram_id)
+    # Dropped from the table meanwhile (withdrawn, evicted): nothing left to answer
+    joined = [other for other in waiting
+              if pending_requests.get(other.request_id) is other]
+    if not joined:
+        return
+    if pending.message_id is not None and pending_requests.get(pending.request_id) is pending:
+        await join_auth_message(telegram_id, pending.message_id, joined)
+    else:
+        # Not delivered, or already answered and deleted: the others need a message
+        await send_auth_message(telegram_id, joined)
+
+
+def open_auth_message(telegram_id):
+    """The newest unanswered message of the chat still young enough to take another account."""
+    newest = None
+    seen = set()
+    for pending in pending_requests.in_chat(telegram_id):
+        # Oldest first: the first request of a message tells its age
+        if pending.message_id is None or pending.message_id in seen:
+            continue
+        seen.add(pending.message_id)
+        if time.time() - pending.sent_at < Config.PUSH_BATCH_WINDOW:
+            newest = pending.message_id
+    return newest
+
+
+async def join_auth_message(telegram_id, message_id, requests):
+    """Add the rows of more accounts to a delivered message and restart its timeout."""
+    for pending in requests:
+        # Set before the edit: a tap arriving meanwhile keeps their rows
+        pending.message_id = message_id
+    merged = pending_requests.on_message(telegram_id, message_id)
+    language = merged[0].language
+    logger.info("Adding %s to the request message %s of telegram id %s",
+                ", ".join(pending.username for pending in requests), message_id, telegram_id)
+    try:
+        await send_limited_edit_text(telegram_id, message_id,
+                                     templates.text("auth_request_batch", language),
+                                     templates.batch_keyboard(language, merged))
+    except aiogram_exceptions.AiogramError as edit_err:
+        # E.g. deleted by a permit tap in the meantime: send the new accounts on their own
+        logger.warning("Request message %s not extended: %s", message_id, edit_err)
+        for pending in requests:
+            pending.message_id = None
+        await send_auth_message(telegram_id, requests)
+        return
+    PUSH_BATCH_SIZE.observe(len(merged))
+    for timer in {pending.timer for pending in merged if pending.timer is not None}:
+        timer.cancel()
+    arm_expiry(merged, Config.FREE2FA_TIMEOUT + 1)
+
+
+async def send_auth_message(telegram_id, requests):
+    """Send one message with the buttons of the given pending requests and arm its timeout."""
+    language = requests[0].language
+    logger.info("Sending an authorization request for"
+                "%s telegram id %s, request %s",
+                ", ".join(pending.username for pending in requests), telegram_id,
+                ", ".join(pending.request_id for pending in requests))
+    # The buttons carry the request ID only: a few bytes whatever the username length
+    if len(requests) == 1:
+        text = templates.text("auth_request", language)
+        markup = templates.auth_keyboard(language, requests[0].request_id)
+    else:
+        text = templates.text("auth_request_batch", language)
+        markup = templates.batch_keyboard(language, requests)
+
+    # Sending a new message and arming its timeout
+    while True:
+        try:
+            sent_message = await send_limited_message(telegram_id, text, markup)
+            break
+        except aiogram_exceptions.TelegramRetryAfter as flood:
+            # 429: wait as told while the logon can still be answered, else it is an API failure
+            if time.time() - requests[0].sent_at + flood.retry_after >= Config.FREE2FA_TIMEOUT:
+                logger.warning("Flood control for %s: %s", telegram_id, flood)
+                drop_unsent_requests(requests, fail_auth_request, flood)
+                return
+            logger.info("Flood control for %s, retry in %d s", telegram_id, flood.retry_after)
+            await asyncio.sleep(flood.retry_after)
+            if any(pending_requests.get(pending.request_id) is not pending
+                   for pending in requests):
+                # Withdrawn meanwhile: the logon gave up, the message would lead nowhere
+                drop_unsent_requests(requests, None, "withdrawn")
+                return
+        except (asyncio.TimeoutError, aiogram_exceptions.TelegramNetworkError,
+                aiogram_exceptions.TelegramServerError) as network_err:
+            # Also raised at once, without a network attempt, while the circuit breaker is open
+            logger.warning("Error when sending message: %s", network_err)
+            drop_unsent_requests(requests, fail_auth_request, network_err)
+            return
+        except aiogram_exceptions.AiogramError as req_err:
+            # Telegram answered, the chat itself is unusable (e.g. the bot is blocked,
+            # TelegramForbiddenError): no pass
+            logger.warning("%s while sending message to %s: %s",
+                           type(req_err).__name__, telegram_id, req_err)
+            drop_unsent_requests(requests, reject_auth_request, req_err)
+            return
+    for pending in requests:
+        pending.message_id = sent_message.message_id
+    arm_expiry(requests, Config.FREE2FA_TIMEOUT + 1)
+
+
+def drop_unsent_requests(requests, decide, reason):
+    """Forget the pushes of a message that was not sent and decide their logons."""
+    for pending in requests:
+        if pending_requests.get(pending.request_id) is pending:
+            pending_requests.pop(pending.request_id)
+            if decide is not None:
+                decide(pending.username, reason)
+
+
+# Pushes are delivered here, off the /authorize request path
+push_queue = PushQueue(send_auth_request, maxsize=Config.PUSH_QUEUE_SIZE,
+                       workers=Config.PUSH_WORKERS)
+
+
+def arm_expiry(requests, delay):
+    """Schedule the timeout notice of a push; the requests of one message share the timer"""
+    timer = timer_wheel.schedule(
+        delay,
+        expire_auth_requests,
+        tuple(pending.request_id for pending in requests),
+        templates.text("was_auth_request", requests[0].language, requests[0].username)
+    )
+    for pending in requests:
+        pending.timer = timer
 
 
 async def delete_message(chat_id, message_id):
@@ -364,79 +858,221 @@ async def delete_message(chat_id, message_id):
         logger.exception("Error in process_auth_response: %s", other_err)
 
 
-async def send_message_after_delay(chat_id, delay, message_text, normalized_username, message_id):
-    """Delete a user's Telegram message"""
-    await asyncio.sleep(delay)
+async def expire_auth_requests(request_ids, message_text):
+    """Replace an unanswered message with a timeout notice (run by the timer wheel)."""
+    expired = [pending for pending in map(pending_requests.pop, request_ids)
+               if pending is not None]
+    if not expired:
+        return
     try:
-        await send_limited_message(chat_id, message_text)
-        await delete_message(chat_id, message_id)
-        auth_requests[normalized_username] = False
-        asyncio.create_task(clear_auth_request(normalized_username))
+        await send_limited_message(expired[0].telegram_id, message_text,
+                                   priority=PRIORITY_CLEANUP)
+        await delete_message(expired[0].telegram_id, expired[0].message_id)
+        for pending in expired:
+            # A newer push for the user is still waiting: its own timer decides
+            if not pending_requests.has_user(pending.username):
+                resolve_auth_request(pending.username, False, ttl=1)
     except aiogram_exceptions.AiogramError as error:
         logger.exception("Error when sending message after delay: %s", error)
 
 
-@router.callback_query(lambda c: c.data.startswith("permit:") or c.data.startswith("reject:"))
+async def withdraw_auth_messages(abandoned):
+    """Take the buttons of withdrawn pushes off their messages (run by the timer wheel)."""
+    messages = {}
+    for pending in abandoned:
+        # Still in the batching window: the flush skips it, there is no message yet
+        if pending.message_id is not None:
+            messages.setdefault((pending.telegram_id, pending.message_id), pending)
+    for (chat_id, message_id), pending in messages.items():
+        try:
+            if pending_requests.on_message(chat_id, message_id):
+                # Other accounts of a merged message are still waiting on it
+                await update_auth_message(chat_id, message_id)
+                continue
+            if pending.timer is not None:
+                pending.timer.cancel()
+            await send_limited_message(
+                chat_id, templates.text("was_auth_request", pending.language, pending.username),
+                priority=PRIORITY_CLEANUP)
+            await delete_message(chat_id, message_id)
+        except aiogram_exceptions.AiogramError as error:
+            logger.exception("Error when withdrawing request message: %s", error)
+
+
+async def update_auth_message(chat_id, message_id):
+    """
+    Leave only the buttons of the accounts still waiting on a request message.
+
+    :return: True if a merged message still has accounts to answer.
+    """
+    remaining = pending_requests.on_message(chat_id, message_id)
+    markup = templates.batch_keyboard(remaining[0].language, remaining) if remaining else None
+    await send_limited_edit_message(chat_id, message_id, markup)
+    return bool(remaining)
+
+
+@router.callback_query(lambda c: c.data.startswith((CALLBACK_PERMIT, CALLBACK_REJECT)))
 async def process_auth_response(callback_query: types.CallbackQuery):
     """Handling the user's response to the request."""
     try:
-        action, domain_and_username = callback_query.data.split(':')
-        normalized_username = domain_and_username.lower()
-        logger.debug("Response Processing for:"
-                     "%s, action: %s", normalized_username, action)
-        auth_requests[normalized_username] = (action == "permit")
-        logger.debug(
-            "State of auth_requests after response processing: %s", auth_requests)
+        permit = callback_query.data.startswith(CALLBACK_PERMIT)
+        request_id = callback_query.data[len(CALLBACK_PERMIT):]
         chat_id = callback_query.from_user.id
         message_id = callback_query.message.message_id
-        await send_limited_edit_message(chat_id, message_id, None)
-        if normalized_username in last_message_info:
-            last_info = last_message_info[normalized_username]
-            message_task = last_info[2]
-            if message_task:
-                message_task.cancel()
-            if action == "reject":
-                logger.debug("Action=reject:")
-            if action == "permit":
-                logger.debug("Action=permit:")
-                await delete_message(callback_query.from_user.id, callback_query.message.message_id)
-            last_message_info[normalized_username] = (time.time() -
-                                                      Config.FREE2FA_TIMEOUT, last_info[1], None)
+        pending = pending_requests.get(request_id)
+        if pending is None or pending.telegram_id != chat_id:
+            # Answered, expired or sent before a restart: it must not decide a newer logon
+            logger.info("Tap on an unknown or finished request %s ignored", request_id)
+            await update_auth_message(chat_id, message_id)
+            return
+        # Dropping the entry also allows a new push for the user right away
+        pending_requests.pop(request_id)
+        normalized_username = pending.username
+        logger.debug("Response Processing for:"
+                     "%s, request %s, permit: %s", normalized_username, request_id, permit)
+        resolve_auth_request(normalized_username, permit, by_user=True)
+        logger.debug("Decision for %s stored, %d pending decisions",
+                     normalized_username, len(auth_requests))
+        if not await update_auth_message(chat_id, message_id):
+            if pending.timer is not None:
+                pending.timer.cancel()
+            if permit:
+                await delete_message(chat_id, message_id)
     except aiogram_exceptions.AiogramError as error:
         logger.exception("Error in process_auth_response: %s", error)
 
 
-async def clear_auth_request(domain_and_username, delay=1):
-    """Clearing the authorization of the request."""
-    await asyncio.sleep(delay)
-    if domain_and_username in auth_requests:
-        del auth_requests[domain_and_username]
-        logger.info("Authorization for %s cleared.", domain_and_username)
-
-
 @app.get("/health")
 async def health_check():
-    """Server status"""
+    """Server status, with the Bot API circuit breaker of the process owning the bot"""
+    if not Config.TELEGRAM_BREAKER_ENABLED:
+        telegram = {"state": "disabled"}
+    elif ipc_client is None:
+        telegram = telegram_breaker.status()
+    else:
+        telegram = remote_breaker_status
+    return JSONResponse(status_code=200, content={"Reply-Message": "OK", "telegram": telegram,
+                                                  "config": config_status()})
+
+
+def reload_config(source):
+    """
+    Apply the current configuration file; the bot process passes it on to the API workers.
+
+    :param source: What asked for the reload, for the log.
+    :return: Names of the changed settings, or None if the file is invalid.
+    """
+    try:
+        changed = Config.reload()
+    except ConfigError as error:
+        logger.error("Configuration not reloaded (%s): %s", source, error)
+        return None
+    if changed:
+        # Decisions stored from now on are kept for the new timeout
+        auth_requests.ttl = user_approvals.ttl = Config.FREE2FA_TIMEOUT
+        logger.info("Configuration %s loaded (%s): %s", Config.version, source,
+                    ", ".join(changed))
+        if ipc_server is not None:
+            ipc_server.broadcast({"op": "reload_config"})
+    return changed
+
+
+def config_status():
+    """Version and load time of the active configuration"""
+    return {"version": Config.version,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(Config.loaded_at)),
+            "restart_required": Config.restart_required}
+
+
+@app.post("/config/reload")
+async def reload_configuration(request: ClientKeyRequest):
+    """Re-read the configuration file in this process and the bot process"""
+    if not ClientKeyStorage.is_valid(request.client_key):
+        return response_403()
+    changed = reload_config("POST /config/reload")
+    if changed is None:
+        return JSONResponse(status_code=500, content={"Reply-Message": "Invalid configuration"})
+    if ipc_client is not None:
+        # The bot process reloads too and tells the other workers
+        try:
+            await ipc_client.send({"op": "reload_config"})
+        except ConnectionError as ipc_err:
+            logger.warning("Bot process unavailable: %s", ipc_err)
+    return JSONResponse(status_code=200, content={"Reply-Message": "OK", "changed": changed,
+                                                  "config": config_status()})
+
+
+@app.post("/cache/reload")
+async def reload_user_cache(request: ClientKeyRequest):
+    """Forced reload of the in-memory user directory, in every API worker"""
+    if not ClientKeyStorage.is_valid(request.client_key):
+        return response_403()
+    await user_directory.reload()
+    if ipc_client is not None:
+        # The bot process passes it on to every worker
+        try:
+            await ipc_client.send({"op": "reload_cache"})
+        except ConnectionError as ipc_err:
+            logger.warning("Bot process unavailable: %s", ipc_err)
+    return response_200()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Metrics in the Prometheus text format"""
+    return PlainTextResponse(render_metrics())
+
+
+@app.post("/telegram/webhook")
+async def telegram_webhook(request: Request):
+    """Receiving updates from Telegram in webhook mode"""
+    if Config.TELEGRAM_MODE != "webhook":
+        # A real 404: response_404() answers 403 for FreeRADIUS
+        return JSONResponse(status_code=404, content={"Reply-Message": "Not Found"})
+    secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(secret, Config.WEBHOOK_SECRET):
+        logger.warning("Webhook call with an invalid secret token")
+        return response_403()
+    try:
+        update = await request.json()
+    except json.JSONDecodeError:
+        update = None
+    if not isinstance(update, dict):
+        logger.warning("Webhook call with a body that is not a JSON update")
+        return JSONResponse(status_code=400, content={"Reply-Message": "Bad Request"})
+    if ipc_client is not None:
+        try:
+            await ipc_client.send({"op": "update", "update": update})
+        except ConnectionError as ipc_err:
+            logger.warning("Bot process unavailable, update dropped: %s", ipc_err)
+            # Telegram retries the update later
+            return JSONResponse(status_code=503, content={"Reply-Message": "Unavailable"})
+    else:
+        # Answer Telegram at once; the handlers may wait for rate limit slots
+        task = asyncio.create_task(feed_telegram_update(update))
+        webhook_tasks.add(task)
+        task.add_done_callback(webhook_tasks.discard)
     return response_200()
 
+
 # =======limits=============
 
 
-async def send_limited_message(chat_id, text, reply_markup=None):
+async def send_limited_message(chat_id, text, reply_markup=None, priority=PRIORITY_AUTH):
     """Method of sending a message"""
-    await MessageLimiter.wait_for_message_slot()
+    await message_limiter.acquire(chat_id, priority)
     return await bot.send_message(chat_id, text, reply_markup=reply_markup)
 
 
 async def answer_limited_message(message, text):
     """Method of sending a reply message"""
-    await MessageLimiter.wait_for_message_slot()
+    await message_limiter.acquire(message.chat.id, PRIORITY_INTERACTIVE)
     return await message.answer(text)
 
 
 async def send_limited_edit_message(chat_id, message_id, reply_markup=None):
     """Method of message modification"""
-    await MessageLimiter.wait_for_message_slot()
+    await message_limiter.acquire(chat_id, PRIORITY_INTERACTIVE)
     return await bot.edit_message_reply_markup(
         chat_id=chat_id,
         message_id=message_id,
@@ -444,20 +1080,48 @@ async def send_limited_edit_message(chat_id, message_id, reply_markup=None):
     )
 
 
+async def send_limited_edit_text(chat_id, message_id, text, reply_markup=None):
+    """Method of message text modification"""
+    await message_limiter.acquire(chat_id, PRIORITY_AUTH)
+    return await bot.edit_message_text(
+        text=text,
+        chat_id=chat_id,
+        message_id=message_id,
+        reply_markup=reply_markup
+    )
+
+
 async def delete_limited_message(chat_id, message_id):
     """Method for deleting a message"""
-    await MessageLimiter.wait_for_message_slot()
+    await message_limiter.acquire(chat_id, PRIORITY_CLEANUP)
     return await bot.delete_message(chat_id, message_id)
 
 # =========================================================
 
 
+async def feed_telegram_update(update):
+    """Pass an update received through the webhook to the dispatcher"""
+    try:
+        await dp.feed_update(bot, types.Update.model_validate(update, context={"bot": bot}))
+    except Exception as error:  # pylint: disable=broad-except
+        logger.exception("Error processing webhook update: %s", error)
+
+
 async def start_aiogram():
     """Bot launch function"""
     while True:
         try:
             logger.info("Bot Launch...")
-            await dp.start_polling(bot)
+            if Config.TELEGRAM_MODE == "webhook":
+                await bot.set_webhook(Config.WEBHOOK_URL,
+                                      secret_token=Config.WEBHOOK_SECRET,
+                                      allowed_updates=dp.resolve_used_update_types())
+                logger.info("Webhook registered: %s", Config.WEBHOOK_URL)
+                break
+            # getUpdates is refused while a webhook from the other mode is registered
+            await bot.delete_webhook()
+            # Signals are left to uvicorn or bot_main, which stop polling themselves
+            await dp.start_polling(bot, handle_signals=False)
             logger.info("The bot has been successfully launched.")
             break  # Exit the loop after a successful start
         except aiogram_exceptions.TelegramNetworkError as network_err:
@@ -468,22 +1132,170 @@ async def start_aiogram():
         await asyncio.sleep(5)  # Delay before the next attempt
 
 
+def http_protocol():
+    """uvicorn HTTP protocol class of the configured parser, with connection metrics"""
+    if Config.API_HTTP == "h11":
+        return H11MetricsProtocol
+    if HttpToolsMetricsProtocol is None:
+        if Config.API_HTTP == "httptools":
+            raise RuntimeError("FREE2FA_API_HTTP=httptools, but httptools is not installed")
+        return H11MetricsProtocol
+    return HttpToolsMetricsProtocol
+
+
+def event_loop_factory():
+    """Factory of the configured event loop; None selects the default asyncio loop"""
+    if Config.API_LOOP == "asyncio":
+        return None
+    if uvloop is None:
+        if Config.API_LOOP == "uvloop":
+            raise RuntimeError("FREE2FA_API_LOOP=uvloop, but uvloop is not installed")
+        return None
+    return uvloop.new_event_loop
+
+
+def run_in_event_loop(coroutine):
+    """asyncio.run() on the configured event loop"""
+    with asyncio.Runner(loop_factory=event_loop_factory()) as runner:
+        return runner.run(coroutine)
+
+
+def server_options():
+    """uvicorn settings shared by the single-process and multi-worker modes"""
+    options = {
+        "host": "0.0.0.0",
+        "port": Config.API_PORT,
+        "log_config": logging_config,
+        "ssl_keyfile": Config.SSL_KEYFILE,
+        "ssl_certfile": Config.SSL_CERTFILE,
+        "timeout_graceful_shutdown": Config.SHUTDOWN_TIMEOUT,
+        "timeout_keep_alive": Config.API_KEEPALIVE_TIMEOUT,
+        "backlog": Config.API_BACKLOG,
+        "limit_concurrency": Config.API_LIMIT_CONCURRENCY or None,
+        "http": http_protocol(),
+        "loop": "uvloop" if event_loop_factory() else "asyncio",
+    }
+    logger.info("Server profile: http=%s loop=%s keep-alive=%ss backlog=%d "
+                "limit_concurrency=%s", options["http"].__name__, options["loop"],
+                options["timeout_keep_alive"], options["backlog"],
+                options["limit_concurrency"])
+    return options
+
+
+async def restore_state():
+    """Bring back the pushes and decisions saved by the previous process"""
+    pending_rows, decision_rows = await load_snapshot(Config.STATE_SNAPSHOT_PATH)
+    now = time.time()
+    restored = 0
+    messages = {}
+    for request_id, username, telegram_id, message_id, sent_at, language in pending_rows:
+        remaining = sent_at + Config.FREE2FA_TIMEOUT + 1 - now
+        # Expired while the service was down, or never sent: a tap on it is ignored
+        # like any stale one
+        if remaining > 0 and message_id is not None:
+            pending = pending_requests.restore(request_id, username, telegram_id,
+                                               sent_at, message_id, language)
+            messages.setdefault((telegram_id, message_id), []).append(pending)
+            restored += 1
+    for requests in messages.values():
+        arm_expiry(requests, requests[0].sent_at + Config.FREE2FA_TIMEOUT + 1 - now)
+    decisions = 0
+    for username, result, expires_at in decision_rows:
+        if expires_at > now:
+            auth_requests.set(username, bool(result), expires_at - now)
+            decisions += 1
+    if pending_rows or decision_rows:
+        logger.info("State restored: %d pending requests, %d decisions", restored, decisions)
+
+
+async def stop_bot(task):
+    """Stop receiving updates, then save what is still waiting for the users"""
+    try:
+        await dp.stop_polling()
+    except RuntimeError:
+        # Webhook mode, or the launch is still being retried
+        task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await push_queue.stop()
+    pending = pending_requests.values()
+    await timer_wheel.stop()
+    try:
+        await save_snapshot(Config.STATE_SNAPSHOT_PATH, pending, auth_requests.snapshot())
+    except aiosqlite.Error as db_err:
+        logger.error("State not saved: %s", db_err)
+
+
 async def main():
     """Launch FastAPI and aiogram in one event loop"""
-    asyncio.create_task(MessageLimiter.reset_message_count())
+    global bot_task  # pylint: disable=global-statement
     loop = asyncio.get_event_loop()
-    loop.create_task(start_aiogram())
-    config = uvicorn.Config(
-        app=app,
-        host="0.0.0.0",
-        port=5000,
-        loop=loop,
-        log_config=logging_config,
-        ssl_keyfile='/app/certs/free2fa4rdg_api.key',
-        ssl_certfile='/app/certs/free2fa4rdg_api.crt'
-    )
+    await restore_state()
+    push_queue.start()
+    loop.add_signal_handler(signal.SIGHUP, reload_config, "SIGHUP")
+    bot_task = loop.create_task(start_aiogram())
+    config = uvicorn.Config(app=app, **server_options())
     server = uvicorn.Server(config)
+    # The lifespan stops the bot once uvicorn has drained on SIGTERM
     await server.serve()
 
+
+async def bot_main():
+    """Bot process of the multi-worker mode: Telegram plus the IPC server"""
+    global ipc_server  # pylint: disable=global-statement
+    await restore_state()
+    push_queue.start()
+    ipc_server = IpcServer(Config.IPC_SOCKET, handle_ipc_request, on_connect=worker_catch_up)
+    await ipc_server.start()
+    loop_lag_monitor.start()
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_config, "SIGHUP")
+    # In webhook mode updates arrive from the API workers over IPC
+    task = asyncio.create_task(start_aiogram())
+    await stopping.wait()
+    await stop_bot(task)
+    await ipc_server.stop()
+    await loop_lag_monitor.stop()
+
+
+def worker_catch_up():
+    """Bot process side: events replayed to an API worker when it (re)connects"""
+    # Workers read the configuration file when they start, e.g. after uvicorn's
+    # SIGHUP restart of the workers: the bot process follows them
+    reload_config("API worker connected")
+    events = [{"op": "decision", "username": username, "result": result, "ttl": ttl,
+               "by_user": username in user_approvals}
+              for username, result, ttl in auth_requests.snapshot()]
+    events.append({"op": "breaker", "status": telegram_breaker.status()})
+    events.extend(client_key_events())
+    return events
+
+
+def run_bot_process():
+    """Entry point of the bot process"""
+    # Ctrl+C reaches the whole process group: the bot stops after the workers, on SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_in_event_loop(bot_main())
+
+
+def run_multi_worker():
+    """Launch one bot process and Config.API_WORKERS uvicorn workers"""
+    bot_process = multiprocessing.get_context("spawn").Process(
+        target=run_bot_process, name="free2fa4rdg_bot", daemon=True)
+    bot_process.start()
+    logger.info("Starting %d API workers", Config.API_WORKERS)
+    try:
+        uvicorn.run("main:app", workers=Config.API_WORKERS, **server_options())
+    finally:
+        bot_process.terminate()
+        bot_process.join()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if Config.API_WORKERS > 1:
+        run_multi_worker()
+    else:
+        run_in_event_loop(main())
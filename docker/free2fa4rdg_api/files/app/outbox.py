@@ -0,0 +1,87 @@
+# outbox.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Bounded queue of outbound pushes served by a fixed set of worker coroutines."""
+
+import time
+import asyncio
+import logging
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger("free2fa4rdg")
+
+JOBS = Counter("free2fa_push_queue_jobs_total",
+               "Pushes offered to the outbound queue by result", ["result"])
+WAIT_SECONDS = Histogram("free2fa_push_queue_wait_seconds",
+                         "Time a push spent in the outbound queue before a worker took it")
+
+
+class QueueFullError(Exception):
+    """The outbound queue holds `maxsize` jobs already."""
+
+
+class PushQueue:
+    """
+    Decouples sending a push from the HTTP request that asked for it.
+
+    submit() only enqueues, so /authorize returns without waiting for the Bot
+    API or the rate limiter. `workers` coroutines take jobs in order and call
+    `handler(*args)`. A key that is already queued is not queued twice.
+    """
+
+    def __init__(self, handler, maxsize, workers):
+        self.handler = handler
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize)
+        self._queued_keys = set()
+        self._tasks = []
+        Gauge("free2fa_push_queue_depth", "Pushes waiting in the outbound queue",
+              callback=self._queue.qsize)
+
+    def submit(self, key, *args):
+        """Queue a job; raises QueueFullError when the queue is full."""
+        if key in self._queued_keys:
+            JOBS.inc(result="duplicate")
+            return
+        try:
+            self._queue.put_nowait((key, args, time.monotonic()))
+        except asyncio.QueueFull as full:
+            JOBS.inc(result="rejected")
+            raise QueueFullError(f"outbound queue is full ({self._queue.maxsize} pushes)") from full
+        self._queued_keys.add(key)
+        JOBS.inc(result="queued")
+
+    async def _work(self):
+        while True:
+            key, args, queued_at = await self._queue.get()
+            self._queued_keys.discard(key)
+            WAIT_SECONDS.observe(time.monotonic() - queued_at)
+            try:
+                await self.handler(*args)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception("Push to %s failed: %s", key, error)
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        """Start the worker coroutines."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; jobs still queued are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        dropped = self._queue.qsize()
+        if dropped:
+            logger.warning("%d queued pushes dropped on shutdown", dropped)
+            JOBS.inc(dropped, result="dropped")
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queued_keys.clear()
@@ -0,0 +1,142 @@
+# pending.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Authorization pushes waiting for a tap, keyed by a short request ID."""
+
+import time
+import secrets
+from collections import OrderedDict
+from metrics import Counter, Gauge
+
+EVICTED = Counter("free2fa_pending_requests_evicted_total",
+                  "Pending requests dropped because the table was full")
+
+# 6 random bytes: 8 URL-safe characters, far below the 64-byte callback_data limit
+REQUEST_ID_BYTES = 6
+
+
+class PendingRequest:
+    """One push sent to a user; message_id and timer are set once it is delivered."""
+    __slots__ = ("request_id", "username", "telegram_id", "language", "sent_at",
+                 "message_id", "timer")
+
+    def __init__(self, request_id, username, telegram_id, language=None):
+        self.request_id = request_id
+        self.username = username
+        self.telegram_id = telegram_id
+        self.language = language
+        self.sent_at = time.time()
+        self.message_id = None
+        self.timer = None
+
+
+class PendingRequests:
+    """
+    Table of pushes awaiting the user's answer.
+
+    The buttons of a push carry its request ID, so a tap resolves exactly the
+    push it belongs to with one dictionary lookup, and a tap on a push that
+    has already been answered or has expired finds nothing. A username index
+    lists the pushes of each user for the duplicate check, for deciding
+    whether an expiring push still has a newer one behind it and for dropping
+    the pushes of a logon that stopped waiting; a chat index
+    finds the accounts still waiting on a merged multi-account message. When
+    the table holds `maxsize` requests the oldest is dropped and its timer
+    cancelled unless another request shares it.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._requests = OrderedDict()  # request_id -> PendingRequest
+        self._by_username = {}          # username -> {request_id: PendingRequest}
+        self._by_chat = {}              # telegram_id -> {request_id: PendingRequest}
+        Gauge("free2fa_pending_requests", "Pushes waiting for the user's answer",
+              callback=lambda: len(self._requests))
+
+    def create(self, username, telegram_id, language=None):
+        """Register a new push for the user and return it with a fresh request ID."""
+        request_id = secrets.token_urlsafe(REQUEST_ID_BYTES)
+        while request_id in self._requests:
+            request_id = secrets.token_urlsafe(REQUEST_ID_BYTES)
+        return self._add(PendingRequest(request_id, username, telegram_id, language))
+
+    def restore(self, request_id, username, telegram_id, sent_at, message_id, language=None):
+        """Put back a request saved by a previous process; its timer is up to the caller."""
+        request = PendingRequest(request_id, username, telegram_id, language)
+        request.sent_at = sent_at
+        request.message_id = message_id
+        return self._add(request)
+
+    def _add(self, request):
+        self._requests[request.request_id] = request
+        self._by_username.setdefault(request.username, {})[request.request_id] = request
+        self._by_chat.setdefault(request.telegram_id, {})[request.request_id] = request
+        while len(self._requests) > self.maxsize:
+            _, oldest = self._requests.popitem(last=False)
+            self._unindex(oldest)
+            if oldest.timer is not None and not any(
+                    other.timer is oldest.timer
+                    for other in self._by_chat.get(oldest.telegram_id, {}).values()):
+                oldest.timer.cancel()
+            EVICTED.inc()
+        return request
+
+    def get(self, request_id):
+        """The pending request with this ID, or None."""
+        return self._requests.get(request_id)
+
+    def pop(self, request_id):
+        """Remove and return the pending request with this ID, or None."""
+        request = self._requests.pop(request_id, None)
+        if request is not None:
+            self._unindex(request)
+        return request
+
+    def pop_user(self, username):
+        """Remove and return every pending request of the user, oldest first."""
+        requests = list(self._by_username.get(username, {}).values())
+        for request in requests:
+            self.pop(request.request_id)
+        return requests
+
+    def latest(self, username):
+        """The most recent pending request of the user, or None."""
+        requests = self._by_username.get(username)
+        if not requests:
+            return None
+        return next(reversed(requests.values()))
+
+    def has_user(self, username):
+        """Whether the user has any push waiting for an answer."""
+        return username in self._by_username
+
+    def in_chat(self, telegram_id):
+        """Every pending request of the chat, oldest first."""
+        return list(self._by_chat.get(telegram_id, {}).values())
+
+    def on_message(self, telegram_id, message_id):
+        """Requests still waiting on one delivered message of the chat, oldest first."""
+        if message_id is None:
+            return []
+        return [request for request in self._by_chat.get(telegram_id, {}).values()
+                if request.message_id == message_id]
+
+    def _unindex(self, request):
+        for index, key in ((self._by_username, request.username),
+                           (self._by_chat, request.telegram_id)):
+            requests = index.get(key)
+            if requests is not None:
+                requests.pop(request.request_id, None)
+                if not requests:
+                    del index[key]
+
+    def values(self):
+        """Every pending request, oldest first."""
+        return list(self._requests.values())
+
+    def __len__(self):
+        return len(self._requests)
@@ -0,0 +1,133 @@
+# ratelimit.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Token-bucket scheduler for Telegram Bot API calls."""
+
+import asyncio
+import bisect
+import itertools
+from metrics import Gauge, Histogram
+
+# Lanes, served in this order when tokens are scarce
+PRIORITY_AUTH = 0         # authorization requests a user is waiting for
+PRIORITY_INTERACTIVE = 1  # replies to the user's own actions
+PRIORITY_CLEANUP = 2      # timeout notices and message deletion
+
+LANE_NAMES = {PRIORITY_AUTH: "auth", PRIORITY_INTERACTIVE: "interactive",
+              PRIORITY_CLEANUP: "cleanup"}
+
+WAIT_SECONDS = Histogram("free2fa_telegram_limiter_wait_seconds",
+                         "Time a Telegram call waited for a rate limit slot", ["lane"])
+
+# Idle per-chat buckets are dropped once there are more than this many of them
+MAX_IDLE_CHAT_BUCKETS = 1024
+
+
+class TokenBucket:
+    """A bucket refilled continuously at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        """Add the tokens accumulated since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now):
+        """Loop time at which one whole token will be available."""
+        return now + max(0.0, 1 - self.tokens) / self.rate
+
+
+class TelegramRateLimiter:
+    """
+    Grants Bot API call slots under a global and a per-chat limit.
+
+    Telegram allows about 30 messages per second overall and about one
+    message per second in a single chat. Waiting calls are kept in priority
+    order; a call for a throttled chat does not hold back calls for other
+    chats, and no lock is held while waiting.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = None
+        self._chats = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer = None
+        Gauge("free2fa_telegram_limiter_queued", "Telegram calls waiting for a slot",
+              callback=lambda: len(self._waiters))
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_CHAT_BUCKETS:
+                self._drop_idle_buckets(now)
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def _drop_idle_buckets(self, now):
+        """Forget chats whose bucket has refilled completely."""
+        for chat_id, bucket in list(self._chats.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._chats[chat_id]
+
+    def _dispatch(self):
+        """Grant slots to waiters in priority order and arm the next wakeup."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._timer = None
+        if self._global is None:
+            self._global = TokenBucket(self.global_rate, self.global_rate, now)
+        self._global.refill(now)
+
+        wakeup = None
+        remaining = []
+        for waiter in self._waiters:
+            _, _, chat_id, future = waiter
+            if future.done():
+                continue
+            if self._global.tokens < 1:
+                remaining.append(waiter)
+                continue
+            bucket = self._chat_bucket(chat_id, now)
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                self._global.tokens -= 1
+                future.set_result(None)
+            else:
+                remaining.append(waiter)
+                ready = bucket.ready_at(now)
+                wakeup = ready if wakeup is None else min(wakeup, ready)
+        self._waiters = remaining
+
+        if remaining and self._global.tokens < 1:
+            ready = self._global.ready_at(now)
+            wakeup = ready if wakeup is None else min(wakeup, ready)
+        if wakeup is not None:
+            self._timer = loop.call_at(wakeup, self._dispatch)
+
+    async def acquire(self, chat_id, priority=PRIORITY_AUTH):
+        """Wait until a call to the chat may be made."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        future = loop.create_future()
+        bisect.insort(self._waiters, (priority, next(self._sequence), chat_id, future))
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+        await future
+        WAIT_SECONDS.observe(loop.time() - started, lane=LANE_NAMES.get(priority, priority))
@@ -16,6 +16,11 @@ MESSAGES = {
     "was_auth_request": ("❌ Была произведена попытка входа но отклонена по таймауту. "
                          "Если вы не пытались войти в систему, отклоните запрос и "
                          "свяжитесь с администратором."),
+    "auth_request_batch": ("🔐 Запросы на авторизацию для нескольких ваших учетных записей. "
+                           "Подтвердите или отклоните каждый. Если вы не пытались войти в "
+                           "систему, отклоните запрос и свяжитесь с администратором."),
     "action_accept": "\U0001f7e2 Подтвердить",
-    "action_reject": "\U0001f534 Отклонить"
+    "action_reject": "\U0001f534 Отклонить",
+    "action_accept_account": "\U0001f7e2 {}",
+    "action_reject_account": "\U0001f534 {}"
 }
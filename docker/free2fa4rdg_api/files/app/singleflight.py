@@ -0,0 +1,44 @@
+# singleflight.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Coalescing of concurrent calls that do the same work for the same key."""
+
+import asyncio
+from metrics import Counter
+
+COALESCED = Counter("free2fa_coalesced_calls_total",
+                    "Calls that joined an identical call already in flight", ["group"])
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers that arrive while it is
+    in flight await the same result. The call runs as its own task, so a
+    caller that goes away does not cancel it for the others.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self._calls = {}
+
+    async def do(self, key, func, *args):
+        """Return func(*args), sharing the result with concurrent callers for the key."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            COALESCED.inc(group=self.group)
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
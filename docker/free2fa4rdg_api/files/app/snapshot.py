@@ -0,0 +1,89 @@
+# snapshot.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Pending requests and decisions carried over a restart in a SQLite file."""
+
+import os
+import time
+import logging
+import aiosqlite
+
+logger = logging.getLogger("free2fa4rdg")
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS pending_requests (
+        request_id TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        telegram_id INTEGER NOT NULL,
+        message_id INTEGER,
+        sent_at REAL NOT NULL,
+        language TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS decisions (
+        username TEXT PRIMARY KEY,
+        result BOOLEAN NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''',
+]
+
+
+async def save_snapshot(path, pending, decisions):
+    """
+    Replace the saved state with the given pushes and decisions.
+
+    :param pending: PendingRequest objects still waiting for a tap.
+    :param decisions: (username, result, remaining seconds) of stored decisions.
+    """
+    now = time.time()
+    async with aiosqlite.connect(path) as connection:
+        # The file holds one shutdown only: recreating keeps its columns current
+        await connection.execute("DROP TABLE IF EXISTS pending_requests")
+        for statement in SCHEMA:
+            await connection.execute(statement)
+        await connection.execute("DELETE FROM decisions")
+        await connection.executemany(
+            "INSERT INTO pending_requests "
+            "(request_id, username, telegram_id, message_id, sent_at, language) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(request.request_id, request.username, request.telegram_id,
+              request.message_id, request.sent_at, request.language) for request in pending])
+        await connection.executemany(
+            "INSERT OR REPLACE INTO decisions (username, result, expires_at) VALUES (?, ?, ?)",
+            [(username, result, now + remaining) for username, result, remaining in decisions])
+        await connection.commit()
+    logger.info("State saved: %d pending requests, %d decisions", len(pending), len(decisions))
+
+
+async def load_snapshot(path):
+    """
+    Read and clear the saved state, so it is restored only once.
+
+    :return: Rows (request_id, username, telegram_id, message_id, sent_at, language)
+             of the pending requests and (username, result, expires_at) of the decisions.
+    """
+    if not os.path.exists(path):
+        return [], []
+    try:
+        async with aiosqlite.connect(path) as connection:
+            async with connection.execute(
+                    "SELECT request_id, username, telegram_id, message_id, sent_at, language "
+                    "FROM pending_requests ORDER BY sent_at") as cursor:
+                pending = await cursor.fetchall()
+            async with connection.execute(
+                    "SELECT username, result, expires_at FROM decisions") as cursor:
+                decisions = await cursor.fetchall()
+            await connection.execute("DELETE FROM pending_requests")
+            await connection.execute("DELETE FROM decisions")
+            await connection.commit()
+    except aiosqlite.Error as db_err:
+        logger.warning("Saved state not restored: %s", db_err)
+        return [], []
+    return pending, decisions
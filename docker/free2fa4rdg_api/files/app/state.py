@@ -0,0 +1,117 @@
+# state.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Bounded key-value store whose entries expire after a time-to-live."""
+
+import heapq
+import time
+from collections import OrderedDict
+from metrics import Counter, Gauge
+
+LIVE_ENTRIES = Gauge("free2fa_state_entries", "Live entries per state store", ["store"])
+EVICTIONS = Counter("free2fa_state_evictions_total",
+                    "Entries removed from a state store by reason", ["store", "reason"])
+
+_MISSING = object()
+
+
+class TTLStore:
+    """
+    Dictionary-like store with a per-entry TTL and a maximum size.
+
+    Expired entries are dropped lazily: on access, and from a heap of expiry
+    times that is drained on every write, so no timer or task is needed per
+    entry. When the store is full the least recently written entry is evicted.
+    """
+
+    def __init__(self, name, ttl, maxsize):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._expiry = []           # heap of (expires_at, key), may hold stale pairs
+        LIVE_ENTRIES.set(0, store=name)
+
+    def _update_gauge(self):
+        LIVE_ENTRIES.set(len(self._data), store=self.name)
+
+    def _purge(self, now):
+        """Drop every entry whose expiry time has passed."""
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == expires_at:
+                del self._data[key]
+                EVICTIONS.inc(store=self.name, reason="expired")
+        # Rewritten keys leave stale heap pairs behind; rebuild when they dominate
+        if len(self._expiry) > 2 * len(self._data) + 64:
+            self._expiry = [(entry[0], key) for key, entry in self._data.items()]
+            heapq.heapify(self._expiry)
+        self._update_gauge()
+
+    def set(self, key, value, ttl=None):
+        """Store a value that expires after `ttl` seconds (the store default if None)."""
+        now = time.monotonic()
+        self._purge(now)
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        heapq.heappush(self._expiry, (expires_at, key))
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            EVICTIONS.inc(store=self.name, reason="capacity")
+        self._update_gauge()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def expire(self, key, ttl):
+        """Shorten or extend the lifetime of an existing entry."""
+        entry = self._data.get(key)
+        if entry is not None:
+            self.set(key, entry[1], ttl)
+
+    def get(self, key, default=None):
+        """Return the value if present and not expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            EVICTIONS.inc(store=self.name, reason="expired")
+            self._update_gauge()
+            return default
+        return entry[1]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def pop(self, key, default=None):
+        """Remove the entry and return its value if it has not expired."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        del self._data[key]
+        self._update_gauge()
+        return value
+
+    def __len__(self):
+        self._purge(time.monotonic())
+        return len(self._data)
+
+    def snapshot(self):
+        """List (key, value, remaining seconds) of every live entry."""
+        now = time.monotonic()
+        self._purge(now)
+        return [(key, value, expires_at - now)
+                for key, (expires_at, value) in self._data.items()]
@@ -0,0 +1,136 @@
+# telemetry.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Hot-path instrumentation: Bot API calls, event-loop lag and HTTP connection reuse."""
+
+import time
+import asyncio
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from uvicorn.protocols.http.h11_impl import H11Protocol
+from metrics import Counter, Gauge, Histogram
+
+try:
+    from uvicorn.protocols.http.httptools_impl import HttpToolsProtocol
+except ImportError:  # httptools is optional
+    HttpToolsProtocol = None
+
+TELEGRAM_SECONDS = Histogram("free2fa_telegram_request_seconds",
+                             "Bot API call latency, rate limit wait excluded", ["method"])
+TELEGRAM_ERRORS = Counter("free2fa_telegram_errors_total",
+                          "Failed Bot API calls by method and error type", ["method", "error"])
+LOOP_LAG_SECONDS = Histogram("free2fa_event_loop_lag_seconds",
+                             "Delay of the event loop in waking up a sleeping task",
+                             buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                                      0.1, 0.25, 0.5, 1, 2.5, 5))
+LOOP_LAG_LAST = Gauge("free2fa_event_loop_lag_last_seconds",
+                      "Event loop lag measured by the latest probe")
+HTTP_CONNECTIONS = Counter("free2fa_http_connections_total",
+                           "Accepted API connections by TLS handshake: full, resumed or none",
+                           ["tls"])
+HTTP_OPEN_CONNECTIONS = Gauge("free2fa_http_open_connections", "Open API connections")
+HTTP_REQUESTS = Counter("free2fa_http_requests_total",
+                        "API requests served on a new or a reused (keep-alive) connection",
+                        ["connection"])
+HTTP_KEEPALIVE_CLOSED = Counter("free2fa_http_keepalive_closed_total",
+                                "Idle connections closed by the server's keep-alive timeout")
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Session middleware timing every Bot API call and counting its failures."""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as error:
+            TELEGRAM_ERRORS.inc(method=name, error=type(error).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=name)
+
+
+class LoopLagMonitor:
+    """
+    Sleeps for a fixed interval and records how late the loop woke it up.
+    A blocking call anywhere in the process shows up as lag here.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        """Start probing in the background."""
+        if self._task is None:
+            LOOP_LAG_LAST.set(0.0)
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG_SECONDS.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+
+    async def stop(self):
+        """Stop probing."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class ConnectionMetricsMixin:
+    """
+    Counts TLS handshakes and keep-alive reuse for a uvicorn HTTP protocol.
+
+    With a libcurl pool on the other side, every logon should be a reused
+    connection; a growing number of full handshakes means connections are
+    being closed between logons.
+    """
+
+    def connection_made(self, transport):
+        # asyncio calls this once the TLS handshake has completed
+        ssl_object = transport.get_extra_info("ssl_object")
+        if ssl_object is None:
+            tls = "none"
+        else:
+            tls = "resumed" if ssl_object.session_reused else "full"
+        HTTP_CONNECTIONS.inc(tls=tls)
+        HTTP_OPEN_CONNECTIONS.inc()
+        self.responses_completed = 0
+        super().connection_made(transport)
+
+    def connection_lost(self, exc):
+        HTTP_OPEN_CONNECTIONS.dec()
+        super().connection_lost(exc)
+
+    def on_response_complete(self):
+        HTTP_REQUESTS.inc(connection="reused" if self.responses_completed else "new")
+        self.responses_completed += 1
+        super().on_response_complete()
+
+    def timeout_keep_alive_handler(self):
+        HTTP_KEEPALIVE_CLOSED.inc()
+        super().timeout_keep_alive_handler()
+
+
+class H11MetricsProtocol(ConnectionMetricsMixin, H11Protocol):
+    """h11 (pure Python) protocol with connection metrics."""
+
+
+if HttpToolsProtocol is not None:
+    class HttpToolsMetricsProtocol(ConnectionMetricsMixin, HttpToolsProtocol):
+        """httptools (C parser) protocol with connection metrics."""
+else:
+    HttpToolsMetricsProtocol = None
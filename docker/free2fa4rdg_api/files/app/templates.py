@@ -0,0 +1,93 @@
+# templates.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Bot messages and request keyboards of every language, prepared once per process."""
+
+from collections import OrderedDict
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+import en_en
+import ru_ru
+from metrics import Counter
+
+LANGUAGES = {"en": en_en.MESSAGES, "ru": ru_ru.MESSAGES}
+FALLBACK_LANGUAGE = "en"
+
+LOOKUPS = Counter("free2fa_template_cache_lookups_total",
+                  "Rendered bot message lookups by result", ["result"])
+
+
+class MessageTemplates:
+    """
+    Serves the bot texts in the language of each user.
+
+    The message catalogs of all languages are loaded at startup and the
+    request keyboard of every language is built once: a push only copies its
+    two buttons with the request ID in callback_data, without validating them
+    again; a merged push copies them once per account. Texts with arguments
+    (the user name, the Telegram ID) are formatted once and kept in an LRU of
+    `cache_size` entries.
+    """
+
+    def __init__(self, default_language, permit_prefix, reject_prefix, cache_size=1024):
+        self.default_language = self.resolve(default_language, FALLBACK_LANGUAGE)
+        self.permit_prefix = permit_prefix
+        self.reject_prefix = reject_prefix
+        self.cache_size = cache_size
+        self._messages = {language: dict(messages) for language, messages in LANGUAGES.items()}
+        self._buttons = {
+            language: (InlineKeyboardButton(text=messages["action_accept"],
+                                            callback_data=permit_prefix),
+                       InlineKeyboardButton(text=messages["action_reject"],
+                                            callback_data=reject_prefix))
+            for language, messages in self._messages.items()}
+        self._rendered = OrderedDict()  # (name, language, args) -> text
+
+    def resolve(self, language, default=None):
+        """Catalog for a user's language or a Telegram language_code; the default if unknown."""
+        if language:
+            language = language[:2].lower()
+            if language in LANGUAGES:
+                return language
+        return default if default is not None else self.default_language
+
+    def text(self, name, language, *args):
+        """The message `name` in the user's language, formatted with `args`."""
+        language = self.resolve(language)
+        if not args:
+            return self._messages[language][name]
+        key = (name, language, args)
+        text = self._rendered.get(key)
+        if text is not None:
+            self._rendered.move_to_end(key)
+            LOOKUPS.inc(result="hit")
+            return text
+        LOOKUPS.inc(result="miss")
+        text = self._messages[language][name].format(*args)
+        self._rendered[key] = text
+        if len(self._rendered) > self.cache_size:
+            self._rendered.popitem(last=False)
+        return text
+
+    def auth_keyboard(self, language, request_id):
+        """Permit/reject buttons of a push; callback_data is the prefix and the request ID."""
+        permit, reject = self._buttons[self.resolve(language)]
+        return InlineKeyboardMarkup.model_construct(inline_keyboard=[[
+            permit.model_copy(update={"callback_data": self.permit_prefix + request_id}),
+            reject.model_copy(update={"callback_data": self.reject_prefix + request_id}),
+        ]])
+
+    def batch_keyboard(self, language, requests):
+        """One permit/reject row per account of a merged push, labelled with the username."""
+        permit, reject = self._buttons[self.resolve(language)]
+        return InlineKeyboardMarkup.model_construct(inline_keyboard=[[
+            permit.model_copy(update={
+                "text": self.text("action_accept_account", language, request.username),
+                "callback_data": self.permit_prefix + request.request_id}),
+            reject.model_copy(update={
+                "text": self.text("action_reject_account", language, request.username),
+                "callback_data": self.reject_prefix + request.request_id}),
+        ] for request in requests])
@@ -0,0 +1,131 @@
+# timers.py
+# Copyright (C) 2024 Voloskov Aleksandr Nikolaevich
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+"""Hashed timer wheel that owns every delayed action of the bot."""
+
+import asyncio
+import logging
+import math
+from metrics import Counter, Gauge
+
+logger = logging.getLogger("free2fa4rdg")
+
+FIRED = Counter("free2fa_timers_fired_total", "Delayed actions executed by the timer wheel")
+
+
+class TimerHandle:
+    """A scheduled action; cancel() removes it from its slot in O(1)."""
+    __slots__ = ("wheel", "callback", "args", "rounds", "slot", "cancelled")
+
+    def __init__(self, wheel, callback, args, rounds, slot):
+        self.wheel = wheel
+        self.callback = callback
+        self.args = args
+        self.rounds = rounds
+        self.slot = slot
+        self.cancelled = False
+
+    def cancel(self):
+        """Prevent the action from running."""
+        if not self.cancelled:
+            self.cancelled = True
+            self.slot.discard(self)
+            self.wheel._count -= 1  # pylint: disable=protected-access
+
+
+class TimerWheel:
+    """
+    A ring of `slots` buckets advanced by one driver task every `tick` seconds.
+
+    A timer lands in the bucket `delay / tick` positions ahead of the cursor;
+    delays longer than one revolution carry a round counter. Coroutine
+    callbacks get a task only when they fire, so pending actions cost a set
+    entry instead of a sleeping coroutine. The driver parks while the wheel
+    is empty.
+    """
+
+    def __init__(self, tick=0.1, slots=512):
+        self.tick = tick
+        self._slots = [set() for _ in range(slots)]
+        self._cursor = 0
+        self._count = 0
+        self._task = None
+        self._wakeup = None
+        self._running = set()
+        Gauge("free2fa_timers_scheduled", "Delayed actions waiting in the timer wheel",
+              callback=self.__len__)
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, delay, callback, *args):
+        """Run callback(*args) after `delay` seconds; coroutines are started as tasks."""
+        ticks = max(1, math.ceil(delay / self.tick))
+        rounds, offset = divmod(ticks, len(self._slots))
+        if offset == 0:
+            rounds, offset = rounds - 1, len(self._slots)
+        slot = self._slots[(self._cursor + offset) % len(self._slots)]
+        handle = TimerHandle(self, callback, args, rounds, slot)
+        slot.add(handle)
+        self._count += 1
+        self._ensure_running()
+        return handle
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _fire(self, handle):
+        FIRED.inc()
+        try:
+            result = handle.callback(*handle.args)
+            if asyncio.iscoroutine(result):
+                task = asyncio.create_task(result)
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception("Delayed action failed: %s", error)
+
+    def _advance(self):
+        """Move the cursor one slot and fire the timers that are due."""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+        for handle in list(slot):
+            if handle.rounds > 0:
+                handle.rounds -= 1
+                continue
+            slot.discard(handle)
+            handle.cancelled = True
+            self._count -= 1
+            self._fire(handle)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            if self._count == 0:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                deadline = loop.time()
+            deadline += self.tick
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            # Catch up on every tick missed while the loop was busy
+            while deadline <= loop.time():
+                self._advance()
+                deadline += self.tick
+            deadline -= self.tick
+
+    async def stop(self):
+        """Stop the driver task; pending timers are dropped."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for slot in self._slots:
+            slot.clear()
+        self._count = 0
@@ -47,7 +47,7 @@ sed -i "s/require_message_authenticator = .*/require_message_authenticator = $RE
 sed -i "s/limit_proxy_state = .*/limit_proxy_state = $REQUIRE_MESSAGE_AUTHENTICATOR/" "$CONFIG_FILE_CLIENT"
 sed -i "/^rest {/,/^}/ s/connect_timeout = .*/connect_timeout = $((RADIUS_CLIENT_TIMEOUT + 3))/" "$CONFIG_FILE_REST"
 sed -i "/^rest {/,/^}/ { /    authenticate {/,/    }/ s/timeout = .*/timeout = $((RADIUS_CLIENT_TIMEOUT + 3))/ }" "$CONFIG_FILE_REST"
-sed -i "s/\"client_key\": \".*\"/\"client_key\": \"$random_key\"/" "$CONFIG_FILE_REST"
+sed -i "s/\"client_key\": \"[^\"]*\"/\"client_key\": \"$random_key\"/" "$CONFIG_FILE_REST"
 sed -i "s/start_servers = .*/start_servers = $RADIUS_START_SERVERS/" "$CONFIG_FILE_RADIUS"
 sed -i "s/max_servers = .*/max_servers = $RADIUS_MAX_SERVERS/" "$CONFIG_FILE_RADIUS"
 sed -i "s/max_spare_servers = .*/max_spare_servers = $RADIUS_MAX_SPARE_SERVERS/" "$CONFIG_FILE_RADIUS"
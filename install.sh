@@ -133,6 +133,13 @@ create_env_file \
 curl -L "https://raw.githubusercontent.com/CLLlAgOB/free2fa4rdg/main/docker-compose/docker-compose.yml" -o docker-compose.yml
 echo "docker-compose.yml downloaded."
 
+# Download the sample settings file reloaded by free2fa4rdg_api, keeping an edited one
+mkdir -p config
+if [ ! -f config/free2fa4rdg_api.env ]; then
+    curl -L "https://raw.githubusercontent.com/CLLlAgOB/free2fa4rdg/main/docker-compose/config/free2fa4rdg_api.env" -o config/free2fa4rdg_api.env
+    echo "config/free2fa4rdg_api.env downloaded."
+fi
+
 # Prompt to start the build
 echo "To start enter"
 echo "docker compose up -d"